@@ -0,0 +1,249 @@
+'''
+multi-armed bandits choosing which fuzzers run in the focus phase.
+one arm per fuzzer, the state lives in numpy arrays and is kept across
+rounds. rewards are in [0, 1], see thompson.rank_rewards.
+
+thompson : Beta(S, F) sampling, the original dcfuzz policy
+dts      : discounted thompson, old rounds fade by `discount`
+swts     : sliding window thompson, only the last `window` rounds count
+ucb1     : mean reward + sqrt(2 ln t / n)
+exp3     : exponential weights mixed with `gamma` uniform exploration
+'''
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from . import config as Config
+
+config = Config.CONFIG
+
+logger = logging.getLogger('dcfuzz.bandit')
+
+
+class Bandit(ABC):
+    name = ''
+
+    def __init__(self, arms: List[str], seed=None):
+        self.arms = list(arms)
+        self.index = {arm: i for i, arm in enumerate(self.arms)}
+        self.rng = np.random.default_rng(seed)
+        self.rounds = 0
+
+    def _mask(self, rewards: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        observed arms as a boolean mask and the rewards as a dense vector
+        '''
+        observed = np.zeros(len(self.arms), dtype=bool)
+        r = np.zeros(len(self.arms))
+        for arm, value in rewards.items():
+            observed[self.index[arm]] = True
+            r[self.index[arm]] = value
+        return observed, r
+
+    @abstractmethod
+    def _draw(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        one draw for every arm: (ranking key, positive cpu weight)
+        '''
+        pass
+
+    @abstractmethod
+    def _update(self, observed: np.ndarray, r: np.ndarray) -> None:
+        pass
+
+    def update(self, rewards: Dict[str, float]) -> None:
+        '''
+        rewards: arm -> reward in [0, 1], arms missing were not observed
+        '''
+        self.rounds += 1
+        observed, r = self._mask(rewards)
+        self._update(observed, np.clip(r, 0, 1))
+        logger.info(f'bandit 001 - {self.name} round {self.rounds} rewards : {rewards}, state : {self.as_dict()}')
+
+    def _draws(self, n: int) -> np.ndarray:
+        '''
+        n independent ranking keys per arm, shape (n, arms)
+        '''
+        return np.stack([self._draw()[0] for _ in range(n)])
+
+    def prob_best(self, samples: int = 2000) -> Dict[str, float]:
+        '''
+        monte carlo probability that each arm wins a draw
+        '''
+        wins = np.bincount(np.argmax(self._draws(samples), axis=1), minlength=len(self.arms))
+        return dict(zip(self.arms, (wins / samples).tolist()))
+
+    def select(self, k: int = 1) -> Tuple[List[str], Dict[str, float]]:
+        '''
+        top-k arms of one draw, best first, with their cpu weights
+        '''
+        key, weight = self._draw()
+        k = max(1, min(k, len(self.arms)))
+        order = np.argsort(-key, kind='stable')[:k]
+        picked = [self.arms[i] for i in order]
+        weights = {self.arms[i]: float(weight[i]) for i in order}
+        logger.info(f'bandit 002 - {self.name} picked : {picked}, weights : {weights}')
+        return picked, weights
+
+    @abstractmethod
+    def state(self) -> Dict[str, np.ndarray]:
+        pass
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {name: dict(zip(self.arms, np.round(values, 4).tolist()))
+                for name, values in self.state().items()}
+
+    def load(self, state: Dict[str, Dict[str, float]]) -> None:
+        '''
+        restore arrays written by as_dict, arms missing keep their prior
+        '''
+        for name, values in self.state().items():
+            for arm, value in state.get(name, {}).items():
+                if arm in self.index:
+                    values[self.index[arm]] = value
+
+
+class ThompsonBandit(Bandit):
+    name = 'thompson'
+
+    def __init__(self, arms: List[str], weight: float = 20, seed=None):
+        '''
+        weight: pseudo counts added per round, reward 0.95 adds S 19 / F 1
+        '''
+        super().__init__(arms, seed)
+        self.weight = weight
+        self.S = np.ones(len(self.arms))
+        self.F = np.ones(len(self.arms))
+
+    def _draw(self):
+        theta = self.rng.beta(self.S, self.F)
+        return theta, theta
+
+    def _draws(self, n):
+        return self.rng.beta(self.S, self.F, size=(n, len(self.arms)))
+
+    def _update(self, observed, r):
+        self.S += observed * self.weight * r
+        self.F += observed * self.weight * (1 - r)
+
+    def state(self):
+        return {'S': self.S, 'F': self.F}
+
+
+class DiscountedThompsonBandit(ThompsonBandit):
+    name = 'dts'
+
+    def __init__(self, arms: List[str], weight: float = 20, discount: float = 0.9, seed=None):
+        super().__init__(arms, weight, seed)
+        self.discount = discount
+
+    def _update(self, observed, r):
+        # NOTE: decay towards the Beta(1, 1) prior, not towards zero
+        self.S = 1 + self.discount * (self.S - 1)
+        self.F = 1 + self.discount * (self.F - 1)
+        super()._update(observed, r)
+
+
+class SlidingWindowThompsonBandit(ThompsonBandit):
+    name = 'swts'
+
+    def __init__(self, arms: List[str], weight: float = 20, window: int = 5, seed=None):
+        super().__init__(arms, weight, seed)
+        self.window = window
+        # per round S / F increments, a ring of the last `window` rounds
+        self.history = np.zeros((window, 2, len(self.arms)))
+
+    def _update(self, observed, r):
+        self.history[self.rounds % self.window] = (observed * self.weight * r,
+                                                   observed * self.weight * (1 - r))
+        self.S = 1 + self.history[:, 0].sum(axis=0)
+        self.F = 1 + self.history[:, 1].sum(axis=0)
+
+    def as_dict(self):
+        return {**super().as_dict(), 'history': self.history.tolist()}
+
+    def load(self, state):
+        super().load(state)
+        if 'history' in state:
+            self.history = np.array(state['history'])
+
+
+class UCB1Bandit(Bandit):
+    name = 'ucb1'
+
+    def __init__(self, arms: List[str], seed=None):
+        super().__init__(arms, seed)
+        self.n = np.zeros(len(self.arms))
+        self.total = np.zeros(len(self.arms))
+
+    def _draw(self):
+        mean = np.divide(self.total, self.n, out=np.full(len(self.arms), 0.5), where=self.n > 0)
+        t = max(1.0, self.n.sum())
+        bonus = np.sqrt(2 * np.log(t) / np.maximum(self.n, 1))
+        # NOTE: arms never observed go first, ties broken at random
+        key = np.where(self.n > 0, mean + bonus, np.inf) + self.rng.random(len(self.arms)) * 1e-9
+        return key, np.maximum(mean, 1e-3)
+
+    def _update(self, observed, r):
+        self.n += observed
+        self.total += observed * r
+
+    def state(self):
+        return {'n': self.n, 'total': self.total}
+
+
+class EXP3Bandit(Bandit):
+    name = 'exp3'
+
+    def __init__(self, arms: List[str], gamma: float = 0.1, seed=None):
+        super().__init__(arms, seed)
+        self.gamma = gamma
+        self.log_w = np.zeros(len(self.arms))
+
+    def probs(self) -> np.ndarray:
+        w = np.exp(self.log_w - self.log_w.max())
+        return (1 - self.gamma) * w / w.sum() + self.gamma / len(self.arms)
+
+    def _draw(self):
+        p = self.probs()
+        # NOTE: top-k of gumbel perturbed log p is a draw of k arms without replacement
+        key = np.log(p) + self.rng.gumbel(size=len(self.arms))
+        return key, p
+
+    def _update(self, observed, r):
+        # NOTE: importance weighted estimate r / p of every observed arm,
+        # p the probability it was drawn with
+        r_hat = observed * r / self.probs()
+        self.log_w += self.gamma * r_hat / len(self.arms)
+
+    def state(self):
+        return {'log_w': self.log_w}
+
+
+BANDITS = {
+    'thompson': ThompsonBandit,
+    'dts': DiscountedThompsonBandit,
+    'swts': SlidingWindowThompsonBandit,
+    'ucb1': UCB1Bandit,
+    'exp3': EXP3Bandit,
+}
+
+
+def make_bandit(name: str, arms: List[str]) -> Bandit:
+    '''
+    build a bandit with its parameters from config['bandit']
+    '''
+    params = config['bandit']
+    if name in ('thompson', 'dts', 'swts'):
+        kw = {'weight': params['weight']}
+        if name == 'dts':
+            kw['discount'] = params['discount']
+        elif name == 'swts':
+            kw['window'] = params['window']
+    elif name == 'exp3':
+        kw = {'gamma': params['exp3_gamma']}
+    else:
+        kw = {}
+    return BANDITS[name](arms, **kw)
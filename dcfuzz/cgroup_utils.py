@@ -1,7 +1,32 @@
 #!/usr/bin/env python3
 '''
-used to test cgroup (V1)
+cgroup backends used to split the cpu between fuzzers.
+
+v1 : cpu controller under /sys/fs/cgroup/cpu, fuzzers launched by cgexec
+     (plus the freezer / cpuacct hierarchies when they are separate mounts)
+v2 : unified hierarchy under /sys/fs/cgroup, fuzzers join through cgroup.procs
+
+both keep the control files open, a quota change is a single write().
 '''
+import logging
+import os
+from abc import ABCMeta, abstractmethod
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('dcfuzz.cgroup_utils')
+
+CGROUP_FS = '/sys/fs/cgroup'
+
+# NOTE: kernel default cfs period
+CPU_PERIOD_US = 100000
+# NOTE: minimal possible number for cgroup
+MIN_QUOTA_US = 1000
+
+BACKEND: Optional['CgroupBackend'] = None
+
+
+class CgroupException(Exception):
+    pass
 
 
 def get_cgroup_path(private=True):
@@ -17,6 +42,304 @@ def get_cgroup_path(private=True):
     return p
 
 
+def is_cgroup_v2() -> bool:
+    return os.path.exists(os.path.join(CGROUP_FS, 'cgroup.controllers'))
+
+
+def cpu_to_quota(cpu: float, period: int) -> int:
+    return max(MIN_QUOTA_US, int(period * cpu))
+
+
+class CgroupBackend(metaclass=ABCMeta):
+    version = ''
+
+    def __init__(self, root: str):
+        '''
+        root: cgroup path of the dcfuzz group inside the hierarchy, e.g. /dcfuzz
+        '''
+        self.root = root
+        self.period = CPU_PERIOD_US
+        self._fds: Dict[str, int] = {}
+
+    def path(self, fuzzer: str) -> str:
+        return os.path.join(self.root, fuzzer)
+
+    @abstractmethod
+    def fs_path(self, cgroup_path: str, hierarchy: str = 'cpu') -> str:
+        pass
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.fs_path(self.root))
+
+    @abstractmethod
+    def init(self, fuzzers: List[str]) -> None:
+        '''
+        create one group per fuzzer, each starts with one full core
+        '''
+        pass
+
+    @abstractmethod
+    def set_cpu(self, fuzzer: str, cpu: float) -> int:
+        '''
+        limit fuzzer to cpu cores (fraction allowed), return the quota in us
+        '''
+        pass
+
+    def set_weight(self, fuzzer: str, weight: int) -> None:
+        raise CgroupException(f'cgroup {self.version} backend has no cpu weight')
+
+    def set_cpuset(self, fuzzer: str, cpus: str) -> None:
+        raise CgroupException(f'cgroup {self.version} backend has no cpuset pinning')
+
+    def use_freezer(self) -> None:
+        '''
+        call before init, fuzzers must be launched inside the freezer group
+        '''
+        pass
+
+    @abstractmethod
+    def freeze(self, fuzzer: str, frozen: bool) -> None:
+        '''
+        stop / restart every process of the fuzzer group at once
+        '''
+        pass
+
+    @abstractmethod
+    def cpu_usage(self, fuzzer: str) -> Optional[float]:
+        '''
+        cpu seconds used by the fuzzer group so far, None if not accounted
+        '''
+        pass
+
+    def launch_prefix(self, cgroup_path: str) -> List[str]:
+        '''
+        command prefix to start a process inside cgroup_path
+        '''
+        return []
+
+    def _write(self, cgroup_path: str, filename: str, value: str, hierarchy: str = 'cpu') -> None:
+        p = os.path.join(self.fs_path(cgroup_path, hierarchy), filename)
+        fd = self._fds.get(p)
+        if fd is None:
+            fd = os.open(p, os.O_WRONLY)
+            self._fds[p] = fd
+        os.pwrite(fd, value.encode(), 0)
+
+    def _read(self, cgroup_path: str, filename: str, hierarchy: str = 'cpu') -> str:
+        with open(os.path.join(self.fs_path(cgroup_path, hierarchy), filename)) as f:
+            return f.read().strip()
+
+    def close(self) -> None:
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+
+class CgroupV1Backend(CgroupBackend):
+    version = 'v1'
+
+    def __init__(self, root: str):
+        super().__init__(root)
+        # hierarchies the fuzzers are launched in
+        self.hierarchies = ['cpu']
+        # NOTE: cpuacct is usually co-mounted with cpu
+        self.acct = 'cpu'
+        if not os.path.exists(os.path.join(CGROUP_FS, 'cpu', 'cpuacct.usage')) and \
+                os.path.exists(os.path.join(CGROUP_FS, 'cpuacct', 'cpuacct.usage')):
+            self.acct = 'cpuacct'
+            self.hierarchies.append('cpuacct')
+
+    def fs_path(self, cgroup_path: str, hierarchy: str = 'cpu') -> str:
+        return os.path.join(CGROUP_FS, hierarchy, cgroup_path.lstrip('/'))
+
+    def use_freezer(self) -> None:
+        if 'freezer' not in self.hierarchies:
+            self.hierarchies.append('freezer')
+
+    def init(self, fuzzers: List[str]) -> None:
+        for hierarchy in self.hierarchies:
+            for fuzzer in fuzzers:
+                os.makedirs(self.fs_path(self.path(fuzzer), hierarchy), exist_ok=True)
+        if fuzzers:
+            self.period = int(self._read(self.path(fuzzers[0]), 'cpu.cfs_period_us'))
+        for fuzzer in fuzzers:
+            self.set_cpu(fuzzer, 1)
+
+    def set_cpu(self, fuzzer: str, cpu: float) -> int:
+        quota = cpu_to_quota(cpu, self.period)
+        self._write(self.path(fuzzer), 'cpu.cfs_quota_us', str(quota))
+        return quota
+
+    def set_weight(self, fuzzer: str, weight: int) -> None:
+        # NOTE: v2 weight 100 is v1 shares 1024
+        self._write(self.path(fuzzer), 'cpu.shares', str(max(2, weight * 1024 // 100)))
+
+    def freeze(self, fuzzer: str, frozen: bool) -> None:
+        self._write(self.path(fuzzer), 'freezer.state', 'FROZEN' if frozen else 'THAWED', hierarchy='freezer')
+
+    def cpu_usage(self, fuzzer: str) -> Optional[float]:
+        try:
+            return int(self._read(self.path(fuzzer), 'cpuacct.usage', hierarchy=self.acct)) / 1e9
+        except OSError:
+            return None
+
+    def launch_prefix(self, cgroup_path: str) -> List[str]:
+        return ['cgexec', '-g', f'{",".join(self.hierarchies)}:{cgroup_path}']
+
+
+class CgroupV2Backend(CgroupBackend):
+    version = 'v2'
+    CONTROLLERS = ('cpu', 'cpuset')
+
+    def fs_path(self, cgroup_path: str, hierarchy: str = 'cpu') -> str:
+        return os.path.join(CGROUP_FS, cgroup_path.lstrip('/'))
+
+    def init(self, fuzzers: List[str]) -> None:
+        available = self._read(self.root, 'cgroup.controllers').split()
+        if 'cpu' not in available:
+            raise CgroupException(f'cpu controller is not delegated to {self.root}')
+        enable = ' '.join(f'+{c}' for c in self.CONTROLLERS if c in available)
+        self._write(self.root, 'cgroup.subtree_control', enable)
+        for fuzzer in fuzzers:
+            os.makedirs(self.fs_path(self.path(fuzzer)), exist_ok=True)
+            self.set_cpu(fuzzer, 1)
+
+    def set_cpu(self, fuzzer: str, cpu: float) -> int:
+        quota = cpu_to_quota(cpu, self.period)
+        self._write(self.path(fuzzer), 'cpu.max', f'{quota} {self.period}')
+        return quota
+
+    def set_weight(self, fuzzer: str, weight: int) -> None:
+        self._write(self.path(fuzzer), 'cpu.weight', str(weight))
+
+    def set_cpuset(self, fuzzer: str, cpus: str) -> None:
+        self._write(self.path(fuzzer), 'cpuset.cpus', cpus)
+
+    def freeze(self, fuzzer: str, frozen: bool) -> None:
+        # NOTE: cgroup.freeze needs no controller, every non-root group has it
+        self._write(self.path(fuzzer), 'cgroup.freeze', '1' if frozen else '0')
+
+    def cpu_usage(self, fuzzer: str) -> Optional[float]:
+        try:
+            for line in self._read(self.path(fuzzer), 'cpu.stat').splitlines():
+                key, _, value = line.partition(' ')
+                if key == 'usage_usec':
+                    return int(value) / 1e6
+        except OSError:
+            pass
+        return None
+
+    def attach(self, cgroup_path: str, pid: int) -> None:
+        self._write(cgroup_path, 'cgroup.procs', str(pid))
+
+    def launch_prefix(self, cgroup_path: str) -> List[str]:
+        '''
+        NOTE: the shell joins the group and execs the fuzzer in place, no
+        python runs between fork and exec (the driver has threads)
+        '''
+        procs = os.path.join(self.fs_path(cgroup_path), 'cgroup.procs')
+        return ['sh', '-c', 'echo $$ > "$0" && exec "$@"', procs]
+
+
+class CgroupManager(object):
+    '''
+    built once in init_cgroup. remembers the quota last written for every
+    fuzzer so unchanged limits cost nothing
+    '''
+    def __init__(self, backend: CgroupBackend, fuzzers: List[str]):
+        self.backend = backend
+        self.fuzzers = list(fuzzers)
+        self.quota: Dict[str, int] = {}
+        self.writes = 0
+        self.skipped = 0
+        self.frozen = set()
+
+    def init(self) -> None:
+        self.backend.init(self.fuzzers)
+        for fuzzer in self.fuzzers:
+            self.quota[fuzzer] = cpu_to_quota(1, self.backend.period)
+
+    def add_group(self, name: str, cpu: float) -> str:
+        '''
+        a group next to the fuzzers that the scheduler never touches (the
+        scorer), return its cgroup path
+        '''
+        self.backend.init([name])
+        self.backend.set_cpu(name, cpu)
+        return self.backend.path(name)
+
+    def set_limit(self, fuzzer: str, cpu: float) -> bool:
+        '''
+        return True if the quota file was written
+        '''
+        quota = cpu_to_quota(cpu, self.backend.period)
+        if self.quota.get(fuzzer) == quota:
+            self.skipped += 1
+            return False
+        self.backend.set_cpu(fuzzer, cpu)
+        self.quota[fuzzer] = quota
+        self.writes += 1
+        return True
+
+    def freeze(self, fuzzer: str) -> None:
+        if fuzzer in self.frozen:
+            return
+        self.backend.freeze(fuzzer, True)
+        self.frozen.add(fuzzer)
+
+    def thaw(self, fuzzer: str) -> None:
+        if fuzzer not in self.frozen:
+            return
+        self.backend.freeze(fuzzer, False)
+        self.frozen.discard(fuzzer)
+
+    def cpu_usage(self) -> Dict[str, Optional[float]]:
+        return {fuzzer: self.backend.cpu_usage(fuzzer) for fuzzer in self.fuzzers}
+
+    def set_limits(self, cpu_assign: Dict[str, float]) -> int:
+        '''
+        one pass for all fuzzers, lowered quotas are written before raised
+        ones so the group never goes over its total while switching
+        '''
+        period = self.backend.period
+
+        def delta(fuzzer):
+            return cpu_to_quota(cpu_assign[fuzzer], period) - self.quota.get(fuzzer, 0)
+        return sum(self.set_limit(fuzzer, cpu_assign[fuzzer])
+                   for fuzzer in sorted(cpu_assign, key=delta))
+
+
+BACKENDS = {
+    'v1': CgroupV1Backend,
+    'v2': CgroupV2Backend,
+}
+
+
+def resolve_version(version: str = 'auto') -> str:
+    if version == 'auto':
+        return 'v2' if is_cgroup_v2() else 'v1'
+    return version
+
+
+def init_backend(root: str, version: str = 'auto') -> CgroupBackend:
+    global BACKEND
+    version = resolve_version(version)
+    BACKEND = BACKENDS[version](root)
+    logger.info(f'cgroup 001 - {version} backend at {BACKEND.fs_path(root)}')
+    return BACKEND
+
+
+def get_backend() -> CgroupBackend:
+    '''
+    the backend set up by init_backend, or one matching the host
+    (fuzzer_driver used on its own)
+    '''
+    global BACKEND
+    if BACKEND is None:
+        init_backend(os.path.join(get_cgroup_path(), 'dcfuzz'))
+    return BACKEND
+
+
 if __name__ == '__main__':
     cgroup_path = get_cgroup_path()
-    print(cgroup_path)
\ No newline at end of file
+    print(cgroup_path, 'v2' if is_cgroup_v2() else 'v1')
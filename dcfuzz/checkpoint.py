@@ -0,0 +1,68 @@
+'''
+campaign checkpoints for --resume.
+one gzipped json file in the output directory, replaced atomically, so a
+crash while writing leaves the previous checkpoint in place.
+'''
+import gzip
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger('dcfuzz.checkpoint')
+
+CHECKPOINT_FILE = 'checkpoint.json.gz'
+# NOTE: 2, sync keeps 64-bit digest keys and pending seeds
+VERSION = 2
+
+
+def checkpoint_path(output_dir: Path) -> Path:
+    return Path(output_dir) / CHECKPOINT_FILE
+
+
+def exists(output_dir: Path) -> bool:
+    return checkpoint_path(output_dir).exists()
+
+
+def save(output_dir: Path, state: Dict) -> None:
+    start_time = time.time()
+    path = checkpoint_path(output_dir)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}')
+    state = {'version': VERSION, 'time': time.time(), **state}
+    with open(tmp, 'wb') as raw:
+        # NOTE: level 1, the digests do not compress much better at higher levels
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=1) as gz:
+            gz.write(json.dumps(state, default=dumper).encode())
+        # NOTE: the gzip trailer is written on close, fsync after it
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+    logger.info(f'checkpoint 001 - saved {path} ({path.stat().st_size} bytes) in {time.time() - start_time:.2f}s')
+
+
+def load(output_dir: Path) -> Optional[Dict]:
+    path = checkpoint_path(output_dir)
+    if not path.exists():
+        return None
+    try:
+        with gzip.open(path, 'rt') as f:
+            state = json.load(f)
+    except (EOFError, OSError, json.JSONDecodeError) as e:
+        # NOTE: gzip.BadGzipFile is an OSError
+        logger.error(f'checkpoint 901 - {path} is corrupt : {e}')
+        return None
+    if state.get('version') != VERSION:
+        logger.error(f'checkpoint 900 - {path} has version {state.get("version")}, expected {VERSION}')
+        return None
+    logger.info(f'checkpoint 002 - loaded {path} written at {state["time"]}')
+    return state
+
+
+def dumper(obj):
+    if isinstance(obj, set):
+        return sorted(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
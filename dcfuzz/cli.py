@@ -6,6 +6,8 @@ from tap import Tap
 from typing import List, Optional
 
 from . import config as Config
+from .bandit import BANDITS
+from .thompson import REWARDS
 
 config = Config.CONFIG
 
@@ -18,6 +20,18 @@ class ArgsParser(Tap):
     focus: int
     timeout: int
     focus_one: Optional[str]
+    cores: int
+    top_k: Optional[int]
+    max_instances: int
+    cgroup: str
+    cpuset: Optional[str]
+    pause_mode: str
+    reward: str
+    bandit: str
+    slicing: str
+    skip_dominated: bool
+    resume: bool
+    sync_mode: str
 
     def configure(self):
         global config
@@ -77,6 +91,65 @@ class ArgsParser(Tap):
                 default=None,
                 help="Used to run a specific individual fuzzer.")
 
+        self.add_argument("--cores",
+                type=int,
+                default=1,
+                help="cores split across fuzzers in the focus phase (default=1)")
+
+        self.add_argument("--top-k",
+                type=int,
+                default=None,
+                help="number of fuzzers sharing the cores in the focus phase (default=cores)")
+
+        self.add_argument("--max-instances",
+                type=int,
+                default=1,
+                help="max afl instances (primary + -S secondaries) per fuzzer in the focus phase (default=1)")
+
+        self.add_argument("--cgroup",
+                choices=['auto', 'v1', 'v2'],
+                default='auto',
+                help="cgroup backend, auto picks v2 on a unified hierarchy (default=auto)")
+
+        self.add_argument("--cpuset",
+                default=None,
+                help="pin every fuzzer to these cpus, e.g. 0-3 (cgroup v2 only)")
+
+        self.add_argument("--pause-mode",
+                choices=['signal', 'freeze'],
+                default='signal',
+                help="pause with SIGSTOP + 1%% quota, or freeze the fuzzer cgroup (default=signal)")
+
+        self.add_argument("--reward",
+                choices=REWARDS,
+                default='score',
+                help="rank fuzzers by best score, or by score gain per cpu second / per million execs during prep (default=score)")
+
+        self.add_argument("--bandit",
+                choices=list(BANDITS),
+                default='thompson',
+                help="focus phase policy: thompson, discounted / sliding window thompson, ucb1 or exp3 (default=thompson)")
+
+        self.add_argument("--slicing",
+                choices=['fixed', 'adaptive'],
+                default='fixed',
+                help="fixed 150s prep slices and --focus long focus, or slices that grow while the score improves (default=fixed)")
+
+        self.add_argument("--skip-dominated",
+                action='store_true',
+                default=False,
+                help="skip prep for fuzzers the bandit rarely picks as best, with rare short probe slices instead")
+
+        self.add_argument("--resume",
+                action='store_true',
+                default=False,
+                help="continue the campaign in --output from its last checkpoint, afl instances are resumed with -i -")
+
+        self.add_argument("--sync-mode",
+                choices=['all', 'selective'],
+                default='all',
+                help="copy every new seed to every fuzzer, or only scored seeds beating the receiver's best, capped per sync (default=all)")
+
 
 
 #    def parse_args(self):
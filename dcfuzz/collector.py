@@ -0,0 +1,268 @@
+'''
+real-time afl statistics collector.
+a thread tails fuzzer_stats (rewritten in place, re-read on mtime change)
+and plot_data (append only, read from the last offset) of every fuzzer and
+keeps the samples of each source in its own fixed size ring buffer.
+plot_data rows carry the instantaneous execs_per_sec, fuzzer_stats the
+lifetime execs_done, so the two series are never mixed.
+'''
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('dcfuzz.collector')
+
+FIELDS = ('time', 'execs_done', 'execs_per_sec', 'paths_total', 'unique_crashes', 'bitmap_cvg')
+COLUMN = {name: i for i, name in enumerate(FIELDS)}
+SOURCES = ('plot', 'stats')
+
+# plot_data: unix_time, cycles_done, cur_path, paths_total, pending_total,
+# pending_favs, map_size, unique_crashes, unique_hangs, max_depth, execs_per_sec
+PLOT_COLUMNS = {'time': 0, 'paths_total': 3, 'bitmap_cvg': 6, 'unique_crashes': 7, 'execs_per_sec': 10}
+STATS_KEYS = {'time': 'last_update', 'execs_done': 'execs_done', 'execs_per_sec': 'execs_per_sec',
+              'paths_total': 'paths_total', 'unique_crashes': 'unique_crashes', 'bitmap_cvg': 'bitmap_cvg'}
+
+
+def to_float(value: str) -> float:
+    try:
+        return float(value.strip().rstrip('%'))
+    except ValueError:
+        return np.nan
+
+
+class StatsRing(object):
+    '''
+    last `capacity` samples, one row of FIELDS each, oldest overwritten
+    '''
+    def __init__(self, capacity: int = 4096):
+        self.data = np.full((capacity, len(FIELDS)), np.nan)
+        self.capacity = capacity
+        self.count = 0
+
+    def append(self, row: np.ndarray) -> None:
+        self.data[self.count % self.capacity] = row
+        self.count += 1
+
+    def latest(self) -> Optional[np.ndarray]:
+        if not self.count:
+            return None
+        return self.data[(self.count - 1) % self.capacity]
+
+    def samples(self) -> np.ndarray:
+        '''
+        time ordered copy
+        '''
+        if self.count <= self.capacity:
+            return self.data[:self.count].copy()
+        head = self.count % self.capacity
+        return np.concatenate((self.data[head:], self.data[:head]))
+
+    def window(self, start: float, end: float) -> np.ndarray:
+        rows = self.samples()
+        t = rows[:, COLUMN['time']]
+        return rows[(t >= start) & (t <= end)]
+
+    def bracket(self, start: float, end: float) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        '''
+        last sample at or before start (the first one if none) and last
+        sample at or before end, consecutive slots share their boundary row
+        '''
+        rows = self.samples()
+        t = rows[:, COLUMN['time']]
+        before = np.flatnonzero(t <= start)
+        upto = np.flatnonzero(t <= end)
+        if not len(upto):
+            return None
+        first = before[-1] if len(before) else 0
+        return rows[first], rows[upto[-1]]
+
+
+class StatsTail(object):
+    '''
+    incremental reader of one afl output directory
+    '''
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.stats_mtime = 0.0
+        self.plot_offset = 0
+        self._partial = b''
+        # NOTE: per source, a plot row older than the last stats row is still new
+        self.last_time = {source: -np.inf for source in SOURCES}
+
+    def _row(self, source: str, values: Dict[str, float]) -> Optional[np.ndarray]:
+        '''
+        one sample of a source, fields it does not have are nan
+        '''
+        t = values.get('time', np.nan)
+        if np.isnan(t) or t < self.last_time[source]:
+            return None
+        self.last_time[source] = t
+        row = np.full(len(FIELDS), np.nan)
+        for name, value in values.items():
+            row[COLUMN[name]] = value
+        return row
+
+    def _read_stats(self) -> List[np.ndarray]:
+        path = os.path.join(self.output_dir, 'fuzzer_stats')
+        try:
+            mtime = os.stat(path).st_mtime
+            if mtime == self.stats_mtime:
+                return []
+            with open(path) as f:
+                text = f.read()
+        except FileNotFoundError:
+            return []
+        self.stats_mtime = mtime
+        stats = {}
+        for l in text.splitlines():
+            key, _, value = l.partition(':')
+            stats[key.strip()] = value
+        values = {name: to_float(stats[key]) for name, key in STATS_KEYS.items() if key in stats}
+        row = self._row('stats', values)
+        return [row] if row is not None else []
+
+    def _read_plot(self) -> List[np.ndarray]:
+        path = os.path.join(self.output_dir, 'plot_data')
+        try:
+            with open(path, 'rb') as f:
+                f.seek(self.plot_offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return []
+        if not chunk:
+            return []
+        self.plot_offset += len(chunk)
+        lines = (self._partial + chunk).split(b'\n')
+        # NOTE: keep a half written last line for the next poll
+        self._partial = lines.pop()
+        rows = []
+        for line in lines:
+            if not line or line.startswith(b'#'):
+                continue
+            cols = line.decode(errors='replace').split(',')
+            if len(cols) <= max(PLOT_COLUMNS.values()):
+                continue
+            row = self._row('plot', {name: to_float(cols[i]) for name, i in PLOT_COLUMNS.items()})
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def poll(self) -> Dict[str, List[np.ndarray]]:
+        return {'plot': self._read_plot(), 'stats': self._read_stats()}
+
+
+class StatsCollector(threading.Thread):
+    def __init__(self, interval: float = 5, capacity: int = 4096):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.capacity = capacity
+        self.tails: Dict[Tuple[str, str], StatsTail] = {}
+        self.rings: Dict[Tuple[str, str], Dict[str, StatsRing]] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def add(self, fuzzer: str, output_dir: str, instance: str = '') -> None:
+        with self._lock:
+            key = (fuzzer, instance)
+            if key in self.tails:
+                return
+            self.tails[key] = StatsTail(str(output_dir))
+            self.rings[key] = {source: StatsRing(self.capacity) for source in SOURCES}
+
+    def poll(self) -> None:
+        with self._lock:
+            for key, tail in self.tails.items():
+                for source, rows in tail.poll().items():
+                    for row in rows:
+                        self.rings[key][source].append(row)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('collector 900 - poll failed')
+            self._stopping.wait(self.interval)
+
+    def _rings(self, fuzzer: str) -> List[Dict[str, StatsRing]]:
+        return [rings for (f, _), rings in self.rings.items() if f == fuzzer]
+
+    @staticmethod
+    def _latest(rings: Dict[str, StatsRing]) -> Optional[np.ndarray]:
+        '''
+        newest value of every field over both sources of one instance
+        '''
+        rows = sorted((r for r in (ring.latest() for ring in rings.values()) if r is not None),
+                      key=lambda r: r[COLUMN['time']])
+        if not rows:
+            return None
+        row = rows[0].copy()
+        for newer in rows[1:]:
+            row = np.where(np.isnan(newer), row, newer)
+        return row
+
+    def latest(self, fuzzer: str) -> Dict[str, float]:
+        '''
+        latest sample of every instance, counters summed
+        '''
+        rows = [r for r in (self._latest(rings) for rings in self._rings(fuzzer)) if r is not None]
+        if not rows:
+            return {}
+        total = np.nansum(rows, axis=0)
+        total[COLUMN['time']] = max(r[COLUMN['time']] for r in rows)
+        # NOTE: coverage is shared through sync, not additive
+        total[COLUMN['bitmap_cvg']] = np.nanmax([r[COLUMN['bitmap_cvg']] for r in rows])
+        return dict(zip(FIELDS, total.tolist()))
+
+    @staticmethod
+    def _delta(ring: StatsRing, field: str, start: float, end: float) -> float:
+        '''
+        growth of a counter between the samples bracketing [start, end]
+        '''
+        rows = ring.bracket(start, end)
+        if rows is None:
+            return 0.0
+        first, last = rows[0][COLUMN[field]], rows[1][COLUMN[field]]
+        if np.isnan(first) or np.isnan(last):
+            return 0.0
+        if last < first:
+            # NOTE: the instance was (re)started in between, its counter too
+            return float(last)
+        return float(last - first)
+
+    def slot(self, fuzzer: str, start: float, end: float) -> Dict[str, float]:
+        '''
+        what fuzzer did between start and end: execs (execs_done of
+        fuzzer_stats), new paths and crashes (plot_data, finer grained)
+        NOTE: fuzzer_stats is rewritten about once a minute, execs landing
+        after its last write are counted in the next slot, none is lost
+        '''
+        self.poll()
+        execs = 0.0
+        paths = 0.0
+        crashes = 0.0
+        for rings in self._rings(fuzzer):
+            execs += self._delta(rings['stats'], 'execs_done', start, end)
+            counts = rings['plot'] if rings['plot'].count else rings['stats']
+            paths += self._delta(counts, 'paths_total', start, end)
+            crashes += self._delta(counts, 'unique_crashes', start, end)
+        elapsed = max(end - start, 1e-9)
+        return {'execs': execs, 'execs_per_sec': execs / elapsed, 'new_paths': paths, 'new_crashes': crashes}
+
+    def as_dict(self) -> Dict[str, Dict[str, Dict[str, List[List[float]]]]]:
+        '''
+        ring contents for the run log, fuzzer -> instance -> source -> rows of FIELDS
+        '''
+        with self._lock:
+            out: Dict[str, Dict[str, Dict[str, List[List[float]]]]] = {}
+            for (fuzzer, instance), rings in self.rings.items():
+                out.setdefault(fuzzer, {})[instance or 'primary'] = {
+                        source: np.where(np.isnan(ring.samples()), None, ring.samples()).tolist()
+                        for source, ring in rings.items()}
+            return out
@@ -42,7 +42,64 @@ CONFIG: Dict = {
     },
     'score_DAFL':{
         'command' : '/fuzzer/score/afl-fuzz',
-        'target_root' : '/benchmark/bin/DAFL'
+        'target_root' : '/benchmark/bin/DAFL',
+        'interval' : 10, # background evaluation period in seconds
+        'drain_timeout' : 30, # max wait for pending scores at the end of prep
+        'slot_drain_timeout' : 10, # max wait for pending scores after an adaptive prep slot
+        'cpu' : 0.5 # cores of the scorer's own cgroup, kept out of the fuzzer slots
+    },
+    # focus phase bandits, see bandit.py
+    'bandit': {
+        'weight': 20, # pseudo counts per round for the thompson variants
+        'discount': 0.9, # dts
+        'window': 5, # swts, rounds
+        'exp3_gamma': 0.1 # exp3 exploration
+    },
+    # --slicing adaptive, see slicing.py
+    'adaptive': {
+        'min_slice': 30,
+        'max_slice': 600, # prep slice, still capped by prep_time per fuzzer
+        'max_focus_factor': 4, # focus grows up to focus_time * factor
+        'grow': 2.0,
+        'shrink': 0.5,
+        'stable_rounds': 2 # prep ends once the ranking repeats this often
+    },
+    # --skip-dominated, prep only for fuzzers that can still win focus
+    'converge': {
+        'samples': 2000, # monte carlo draws for P(best)
+        'dominated': 0.05, # below this P(best) a fuzzer skips prep
+        'probe_every': 3, # rounds between probes, doubles while dominated
+        'max_probe_gap': 12,
+        'probe_factor': 0.25 # share of the prep slice a probe gets
+    },
+    # new test cases of every fuzzer queue / crashes / hangs directory
+    'watcher': {
+        'backend': 'inotify', # or 'watchdog', inotify falls back to it when unavailable
+        'capacity': 65536 # paths kept per watcher, consumers read them by cursor
+    },
+    # --sync-mode selective, see sync.sync_selective
+    'sync': {
+        'max_per_sync': 50, # seeds forwarded to one fuzzer per sync
+        'pending': 4096 # seeds kept waiting for a score or a free slot
+    },
+    # content-addressed seed copies, see seedstore.py
+    'seedstore': {
+        'hash_workers': None, # threads hashing a sync batch, None = cpu count
+        'path_cache': 65536 # filename -> digest entries kept, least recently used go first
+    },
+    # event stream in {output}/runlog.jsonl, see runlog.py
+    'runlog': {
+        'flush_interval': 1, # seconds between writes of the buffered events
+        'fsync_interval': 10 # seconds between fsyncs
+    },
+    # --resume, see checkpoint.py
+    'checkpoint': {
+        'interval': 600 # seconds, also written after every dcfuzz round
+    },
+    # fuzzer_stats / plot_data time series kept in memory
+    'collector': {
+        'interval': 5, # afl appends plot_data every 5 seconds
+        'capacity': 4096 # samples kept per fuzzer instance
     },
     # only specify basic things
     # how to launch fuzzers with proper arguments is handled by fuzzer driver
@@ -13,21 +13,32 @@ class AFLGoSeed(BaseModel):
     name = pw.TextField(unique=True)   # id:000123,...
     prox_score = pw.IntegerField(null=True)
     bitmap_size = pw.IntegerField(null=True)
+    digest = pw.CharField(null=True)   # key in the seed store
 
 
 class WindRangerSeed(BaseModel):
     name = pw.TextField(unique=True)
     prox_score = pw.IntegerField(null=True)
     bitmap_size = pw.IntegerField(null=True)
+    digest = pw.CharField(null=True)   # key in the seed store
 
 
 class DAFLSeed(BaseModel):
     name = pw.TextField(unique=True)
     prox_score = pw.IntegerField(null=True)
     bitmap_size = pw.IntegerField(null=True)
+    digest = pw.CharField(null=True)   # key in the seed store
 
 
 def init_db(database: pw.Database):
     db.initialize(database)
     database.connect(reuse_if_open=True)
     database.create_tables([AFLGoSeed, WindRangerSeed, DAFLSeed])
+
+
+def bind_db(database: pw.Database, model):
+    # NOTE: bind a single seed table to its own database so several fuzzers
+    # can stay open at the same time (init_db re-points the shared proxy)
+    model.bind(database)
+    database.connect(reuse_if_open=True)
+    database.create_tables([model])
@@ -6,10 +6,17 @@ import shutil
 import time
 import logging
 import subprocess
+import threading
+import queue
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Set, Tuple
+
 import peewee
 
 from . import config as Config
-from .evaluateDB import AFLGoSeed, WindRangerSeed, DAFLSeed, init_db
+from . import cgroup_utils, runlog, seedstore, watcher
+from .mytype import SeedType
+from .evaluateDB import AFLGoSeed, WindRangerSeed, DAFLSeed, bind_db
 
 CONFIG = Config.CONFIG
 SCORE_CONFIG = CONFIG['score_DAFL']
@@ -55,44 +62,6 @@ def normalize_afl_seed_id(name: str) -> str:
 
     return m.group(1)
 
-def extract_afl_seed_id(line: str) -> str:
-    _, rest = line.split(",", 1)          
-    base = os.path.basename(rest)         
-    m = re.search(r"((?:[a-zA-Z0-9]+_)?id:\d+)", base)    
-    if not m:
-        raise ValueError(f"Cannot find seed id in line: {line}")
-    return m.group(0)
-
-def parse_score_file(path):
-    parse_data = {}
-    with open(path, "r") as f:
-        lines = f.read().strip().splitlines()
-
-    for line in lines[1:]:
-        parts = line.split(",")
-
-        prox_score = int(parts[-3])
-        bitmap_size = int(parts[-1])
-
-        filename_parts = parts[1:-3]
-        
-        name = extract_afl_seed_id(line)
-        parse_data[name] = (prox_score, bitmap_size)
-        logger.info(f"evaluator 222 - name : {name}, parse_data : {parse_data[name]}")
-
-    return parse_data
-
-
-def wait_for_file(path):
-    wait_time = 0
-    while not os.path.exists(path):
-        wait_time += 1
-        time.sleep(1)
-        if wait_time == 600:
-            logger.info('evaluator 666 - no exists')
-            break
-
-
 def cleanup_score_artifacts(score_file, snapshot_dir, score_workdir):
     if os.path.exists(score_file):
         try:
@@ -119,125 +88,452 @@ def get_seed_model(fuzzer: str):
 
 
 # -----------------------------
-# Snapshot: copy only "new" seeds for this fuzzer
+# Best score: running per-fuzzer record, O(1) to read
 # -----------------------------
-def snapshot_dir_incremental(fuzzer: str, src_queue: str, dst_dir: str):
-    logger.info(f'evaluator 003 - incremental snapshot: fuzzer={fuzzer}, src_queue={src_queue}, dst_dir={dst_dir}')
-
-    SeedModel = get_seed_model(fuzzer)
-
-    src = Path(src_queue)
-    dst = Path(dst_dir)
-
-    if dst.exists():
-        shutil.rmtree(dst)
-    dst.mkdir(parents=True, exist_ok=True)
-
-    staged_names = []
+ScoreResult = Tuple[str, int, int]
+# (fuzzer, seed paths, afl -S instance or None)
+Batch = Tuple[str, List[Path], Optional[str]]
+
+
+class BestScore(object):
+    def __init__(self, fuzzer: str):
+        self.fuzzer = fuzzer
+        self.score = -1
+        self.bitmap_size = -1
+        self.seed: Optional[str] = None
+        # seconds from the campaign start, None if loaded from a previous DB
+        self.time_to_best: Optional[float] = None
+        # (elapsed, score, seed) for every improvement
+        self.history: List[Tuple[float, int, str]] = []
+
+    def as_dict(self):
+        return {
+            'score': self.score,
+            'bitmap_size': self.bitmap_size,
+            'seed': self.seed,
+            'time_to_best': self.time_to_best,
+            'history': self.history
+        }
+
+
+class ScoreBoard(object):
+    def __init__(self, start_time: float):
+        self.start_time = start_time
+        self.records: Dict[str, BestScore] = {}
+        # called with (fuzzer, record) on every new best
+        self.listeners: List = []
+        self._lock = threading.Lock()
+
+    def best(self, fuzzer: str) -> BestScore:
+        record = self.records.get(fuzzer)
+        if record is None:
+            with self._lock:
+                record = self.records.setdefault(fuzzer, BestScore(fuzzer))
+        return record
+
+    def load(self, fuzzer: str, seed: str, score: int, bitmap_size: int):
+        record = self.best(fuzzer)
+        with self._lock:
+            if score > record.score:
+                record.score = score
+                record.bitmap_size = bitmap_size
+                record.seed = seed
+
+    def update(self, fuzzer: str, results: List[ScoreResult]) -> bool:
+        '''
+        fold a scored batch into the record, return True on a new best
+        '''
+        if not results:
+            return False
+        seed, score, bitmap_size = max(results, key=lambda r: r[1])
+        record = self.best(fuzzer)
+        with self._lock:
+            if score <= record.score:
+                return False
+            elapsed = time.time() - self.start_time
+            record.score = score
+            record.bitmap_size = bitmap_size
+            record.seed = seed
+            record.time_to_best = elapsed
+            record.history.append((elapsed, score, seed))
+        logger.info(f'evaluator 500 - {fuzzer} new best score {score} by {seed} at {elapsed}')
+        for listener in self.listeners:
+            listener(fuzzer, record)
+        return True
+
+    def as_dict(self):
+        return {fuzzer: record.as_dict() for fuzzer, record in self.records.items()}
+
+    def restore(self, saved: Dict[str, Dict]) -> None:
+        '''
+        history and time to best from a checkpoint, the scores themselves
+        are also in the DB
+        '''
+        for fuzzer, d in saved.items():
+            record = self.best(fuzzer)
+            with self._lock:
+                if d['score'] >= record.score:
+                    record.score = d['score']
+                    record.bitmap_size = d['bitmap_size']
+                    record.seed = d['seed']
+                    record.time_to_best = d['time_to_best']
+                record.history = [tuple(h) for h in d['history']]
 
-    for p in src.iterdir():
-        if not p.is_file():
-            continue
-        if p.name.startswith(".") or p.name == "README.txt":
-            continue
 
-        seed_id = normalize_afl_seed_id(p.name)
+# -----------------------------
+# Score service: one long-lived evaluator per target
+# -----------------------------
+SCORE_FILE = 'initial_seed_scores.txt'
+STAGED_PREFIX = 'seed_'
+# cgroup of the score binary, next to the fuzzer groups
+SCORE_GROUP = 'score'
+
+
+def gen_run_env():
+    env = {
+        'AFL_NO_UI': '1',
+        'AFL_SKIP_CPUFREQ': '1',
+        'AFL_NO_AFFINITY': '1',
+        'AFL_SKIP_CRASHES': '1',
+        'AFL_I_DONT_CARE_ABOUT_MISSING_CRASHES': '1'
+    }
+    return {**os.environ, **env}
+
+
+def parse_staged_score_file(path):
+    '''
+    map staged name (seed_XXXXXX) -> (prox_score, bitmap_size).
+    afl renames every input to id:NNNNNN,orig:<staged name>, so the
+    staged name is recovered from the filename column instead of relying
+    on the queue order.
+    '''
+    parse_data = {}
+    with open(path, "r") as f:
+        lines = f.read().strip().splitlines()
 
-        if SeedModel.select().where(SeedModel.name == seed_id).exists():
+    for line in lines[1:]:
+        parts = line.split(",")
+        m = re.search(rf"({STAGED_PREFIX}\d+)", line)
+        if not m:
             continue
+        parse_data[m.group(1)] = (int(parts[-3]), int(parts[-1]))
 
-        shutil.copy2(p, dst / p.name)
-        staged_names.append(seed_id)
-
-    logger.info(f"evaluator 004 - staged new seeds: {len(staged_names)}")
-    return staged_names
-
-
-def max_prox_from_db(fuzzer: str) -> int:
-    SeedModel = get_seed_model(fuzzer)
-    v = (SeedModel
-         .select(peewee.fn.COALESCE(peewee.fn.MAX(SeedModel.prox_score), -1))
-         .scalar())
-    return int(v)
-
-
-def extract_score(fuzzer, seed, output_dir, program):
-    logger.info(f'evaluator 001 - fuzzer : {fuzzer}, seed : {seed}, output_dir : {output_dir}, program : {program}')
-
-    seed_path = os.path.realpath(seed)
-    output_path = os.path.realpath(output_dir)
-
-    base_dir = "/home/dcfuzz"
-    score_path = os.path.join(base_dir, "initial_seed_scores.txt")
-
-    os.makedirs(output_path, exist_ok=True)
-
-    db_path = os.path.join(output_path, f"{fuzzer}.sqlite")
-    database = peewee.SqliteDatabase(db_path)
-    init_db(database)
-
-    snapshot_input = os.path.join(output_path, "input_snapshot")
-
-    score_workdir = os.path.join(output_path, f"_score_run_{fuzzer}_{program}")
-
-    # delete remain file or folder
-    cleanup_score_artifacts(score_file=score_path, snapshot_dir=snapshot_input, score_workdir=score_workdir)
-    os.makedirs(score_workdir, exist_ok=True)
-
-    staged_names = snapshot_dir_incremental(
-        fuzzer=fuzzer,
-        src_queue=seed_path,
-        dst_dir=snapshot_input
-    )
-
-    if not staged_names:
-        max_cached = max_prox_from_db(fuzzer)
-        logger.info(f"evaluator 010 - no new seeds for {fuzzer}. return max_cached={max_cached}")
-        cleanup_score_artifacts(score_file=score_path, snapshot_dir=snapshot_input, score_workdir=score_workdir)
-        return max_cached
-
-    args = gen_run_args(seed=snapshot_input, output=score_workdir, program=program)
-    logger.info(f'evaluator 002 - args : {args}')
-
-    result = subprocess.run(
-        args,
-        stdin=subprocess.DEVNULL,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-
-    if result.returncode != 0:
-        logger.info(f"evaluator 9999 : afl-fuzz failed (rc={result.returncode})")
-        logger.info(f"evaluator 6666 : stdout:\n{result.stdout}")
-        logger.info(f"evaluator 6666 : stderr:\n{result.stderr}")
-
-    wait_for_file(path=score_path)
-    
-    if not os.path.exists(score_path):
-        max_cached = max_prox_from_db(fuzzer)
-        logger.info(f"evaluator 011 - score file not created. return max_cached={max_cached}")
-        cleanup_score_artifacts(score_file=score_path, snapshot_dir=snapshot_input, score_workdir=score_workdir)
-        return max_cached
-
-    name_to_score = parse_score_file(score_path)
-    parsed_scores = list(name_to_score.values())
-
-    SeedModel = get_seed_model(fuzzer)
-    with database.atomic():
-        for name, (prox, bmsz) in zip(staged_names, parsed_scores):
-            row, _ = SeedModel.get_or_create(name=name)
-            row.prox_score = prox
-            row.bitmap_size = bmsz
-            row.save()
-
-    cleanup_score_artifacts(score_file=score_path, snapshot_dir=snapshot_input, score_workdir=score_workdir)
-
-    max_score = max_prox_from_db(fuzzer)
-    logger.info(f"evaluator 020 - fuzzer={fuzzer} max_score(from DB)={max_score}")
-    return max_score
-
+    return parse_data
 
 
+class ScoreService(object):
+    '''
+    keep the score databases, the work directory and a worker thread alive
+    for the whole campaign. batches of seed paths are sent through a request
+    queue and answered with a list of (seed_id, prox_score, bitmap_size).
+
+    NOTE: the score binary (DAFL patched to dump scores after the dry run)
+    exits after every launch and cannot stay resident. score_all() stages the
+    new seeds of every fuzzer together, so the pipeline pays one launch per
+    pass rather than one per fuzzer and instance.
+    '''
+    def __init__(self, program: str, output_dir: str, start_time: Optional[float] = None,
+                 cgroup_path: str = ''):
+        self.program = program
+        self.output_dir = os.path.realpath(output_dir)
+        # NOTE: the scorer runs beside the fuzzers, its cpu must not count in their slots
+        self.cgroup_path = cgroup_path
+        self.board = ScoreBoard(start_time or time.time())
+        self.databases = {}
+        # 64-bit key of the seed store digest (as in seedstore.DigestSet) ->
+        # (prox_score, bitmap_size), same content same score. NOTE: no hex string
+        # per unique seed, this lives for the whole campaign
+        self.digest_scores: Dict[int, Tuple[int, int]] = {}
+        # scored seed ids per fuzzer, loaded once from the DB
+        self.scored: Dict[str, Set[str]] = {}
+        self._requests: queue.Queue = queue.Queue()
+        self._worker = None
+        self._batch_num = 0
+
+    def start(self):
+        if self._worker is not None:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._worker = threading.Thread(target=self._serve, daemon=True)
+        self._worker.start()
+        logger.info(f'evaluator 300 - score service started for {self.program}')
+
+    def stop(self):
+        if self._worker is None:
+            return
+        self._requests.put(None)
+        self._worker.join()
+        self._worker = None
+        for database in self.databases.values():
+            database.close()
+        logger.info('evaluator 301 - score service stopped')
+
+    def _call(self, fn, *args) -> Future:
+        future: Future = Future()
+        self._requests.put((fn, args, future))
+        return future
+
+    def submit(self, fuzzer: str, seed_paths: List[Path], instance: Optional[str] = None) -> Future:
+        '''
+        queue a batch, the future resolves to the newly scored seeds.
+        instance: afl -S secondary the seeds come from, prefixed to the seed ids
+        '''
+        return self._call(self._score_batch, fuzzer, list(seed_paths), instance)
+
+    def score(self, fuzzer: str, seed_paths: List[Path], instance: Optional[str] = None) -> List[ScoreResult]:
+        return self.submit(fuzzer, seed_paths, instance).result()
+
+    def score_all(self, batches: List[Batch]) -> List[List[ScoreResult]]:
+        '''
+        score (fuzzer, seed_paths, instance) batches with one launch of the
+        score binary, return the newly scored seeds of each batch
+        '''
+        return self._call(self._score_batches, list(batches)).result()
+
+    def load(self, fuzzer: str) -> None:
+        '''
+        open the fuzzer DB in the worker, filling the scored set and best score
+        '''
+        self._call(self._database, fuzzer).result()
+
+    def max_score(self, fuzzer: str) -> int:
+        return self.board.best(fuzzer).score
+
+    # ---- worker side ----
+
+    def _database(self, fuzzer):
+        if fuzzer not in self.databases:
+            db_path = os.path.join(self.output_dir, f"{fuzzer}.sqlite")
+            database = peewee.SqliteDatabase(db_path)
+            SeedModel = get_seed_model(fuzzer)
+            bind_db(database, SeedModel)
+            self.databases[fuzzer] = database
+            scored = set()
+            for name, prox, bmsz, digest in SeedModel.select(
+                    SeedModel.name, SeedModel.prox_score, SeedModel.bitmap_size, SeedModel.digest).tuples():
+                scored.add(name)
+                if digest:
+                    self.digest_scores[seedstore.digest_key(digest)] = (prox, bmsz)
+                if prox is not None:
+                    self.board.load(fuzzer, name, prox, bmsz)
+            self.scored[fuzzer] = scored
+        return self.databases[fuzzer]
+
+    def _serve(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            fn, args, future = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                logger.exception(f'evaluator 399 - score request failed: {args}')
+                future.set_exception(e)
+
+    def _unscored(self, fuzzer, seed_paths, instance=None):
+        '''
+        set difference against the in-memory scored ids, no DB round trip
+        '''
+        scored = self.scored[fuzzer]
+        new_seeds = []
+        for p in seed_paths:
+            seed_id = normalize_afl_seed_id(p.name)
+            if instance:
+                # NOTE: secondaries reuse the primary's id numbers
+                seed_id = f'{instance}_{seed_id}'
+            if seed_id in scored:
+                continue
+            new_seeds.append((seed_id, p))
+        return new_seeds
+
+    def _score_batch(self, fuzzer, seed_paths, instance=None) -> List[ScoreResult]:
+        return self._score_batches([(fuzzer, seed_paths, instance)])[0]
+
+    def _score_batches(self, batches) -> List[List[ScoreResult]]:
+        new = []
+        for fuzzer, seed_paths, instance in batches:
+            self._database(fuzzer)
+            new.append(self._unscored(fuzzer, seed_paths, instance))
+        if not any(new):
+            return [[] for _ in batches]
+
+        self._batch_num += 1
+        start_time = time.time()
+
+        workdir = os.path.join(self.output_dir, f"_score_run_{self.program}")
+        snapshot_input = os.path.join(workdir, "input_snapshot")
+        afl_output = os.path.join(workdir, "out")
+        score_path = os.path.join(workdir, SCORE_FILE)
+        cleanup_score_artifacts(score_file=score_path, snapshot_dir=snapshot_input, score_workdir=afl_output)
+        os.makedirs(snapshot_input, exist_ok=True)
+
+        store = seedstore.STORE
+        results: List[List[ScoreResult]] = [[] for _ in batches]
+        seed_digest: List[Dict[str, str]] = [{} for _ in batches]
+        # digest -> (batch, seed id) waiting for a score
+        pending: Dict[str, List[Tuple[int, str]]] = {}
+        for b, new_seeds in enumerate(new):
+            digests = store.add_many(p for _, p in new_seeds)
+            for (seed_id, p), digest in zip(new_seeds, digests):
+                if digest is None:
+                    continue
+                seed_digest[b][seed_id] = digest
+                cached = self.digest_scores.get(seedstore.digest_key(digest))
+                if cached is not None:
+                    # NOTE: already scored for some fuzzer (e.g. a synced seed)
+                    results[b].append((seed_id, *cached))
+                    continue
+                pending.setdefault(digest, []).append((b, seed_id))
+
+        staged = {}
+        for i, digest in enumerate(pending):
+            staged_name = f'{STAGED_PREFIX}{i:06d}'
+            store.link(digest, os.path.join(snapshot_input, staged_name))
+            staged[staged_name] = digest
+
+        if staged:
+            args = gen_run_args(seed=snapshot_input, output=afl_output, program=self.program)
+            if self.cgroup_path:
+                args = cgroup_utils.get_backend().launch_prefix(self.cgroup_path) + args
+            result = subprocess.run(args,
+                                    cwd=workdir,
+                                    env=gen_run_env(),
+                                    stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE,
+                                    text=True)
+
+            if os.path.exists(score_path):
+                name_to_score = parse_staged_score_file(score_path)
+                for staged_name, (prox, bmsz) in name_to_score.items():
+                    if staged_name not in staged:
+                        continue
+                    digest = staged[staged_name]
+                    self.digest_scores[seedstore.digest_key(digest)] = (prox, bmsz)
+                    for b, seed_id in pending[digest]:
+                        results[b].append((seed_id, prox, bmsz))
+            else:
+                logger.info(f"evaluator 311 - score file not created (rc={result.returncode})")
+                logger.info(f"evaluator 6666 : stderr:\n{result.stderr}")
+
+        for (fuzzer, _, _), batch_results, digests in zip(batches, results, seed_digest):
+            self._record(fuzzer, batch_results, digests)
+
+        cleanup_score_artifacts(score_file=score_path, snapshot_dir=snapshot_input, score_workdir=afl_output)
+
+        diff = time.time() - start_time
+        scored = {f'{fuzzer}/{instance or "primary"}': len(r) for (fuzzer, _, instance), r in zip(batches, results)}
+        logger.info(f"evaluator 310 - batch {self._batch_num} staged={len(staged)} scored={scored} take {diff} seconds")
+        runlog.event('evaluate', staged=len(staged), scored=scored, seconds=diff)
+        return results
+
+    def _record(self, fuzzer, results, seed_digest):
+        SeedModel = get_seed_model(fuzzer)
+        with self.databases[fuzzer].atomic():
+            rows = [{'name': n, 'prox_score': prox, 'bitmap_size': bmsz, 'digest': seed_digest[n]}
+                    for n, prox, bmsz in results]
+            for chunk in peewee.chunked(rows, 100):
+                SeedModel.insert_many(chunk).on_conflict_replace().execute()
+
+        self.scored[fuzzer].update(n for n, _, _ in results)
+        self.board.update(fuzzer, results)
 
 
+# -----------------------------
+# Background pipeline: score seeds while the fuzzers run
+# -----------------------------
+class EvaluationPipeline(threading.Thread):
+    '''
+    follow the queue events of every fuzzer watcher and keep scoring new
+    seeds in the background. the scheduler only reads the cached max score.
+    '''
+    def __init__(self, service: ScoreService, fuzzers: List[str], interval: float = 10):
+        super().__init__(daemon=True)
+        self.service = service
+        self.fuzzers = fuzzers
+        self.interval = interval
+        self._cursor: Dict[watcher.Watcher, int] = {}
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._idle = threading.Condition()
+        self._busy = False
+
+    def max_score(self, fuzzer: str) -> int:
+        return self.service.max_score(fuzzer)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def _is_score_target(self, w: watcher.Watcher, test_case_path: Path) -> bool:
+        if not test_case_path.name.startswith('id:'):
+            return False
+        return w._get_test_case_type(test_case_path) == SeedType.NORMAL
+
+    def _queue_lengths(self) -> Dict[watcher.Watcher, int]:
+        lengths = {}
+        for fuzzer in self.fuzzers:
+            for w in watcher.WATCHERS.get(fuzzer, []):
+                lengths[w] = w.test_case_queue.end
+        return lengths
+
+    def _pending(self, lengths: Dict[watcher.Watcher, int]) -> bool:
+        return any(self._cursor.get(w, 0) < n for w, n in lengths.items())
+
+    def _collect(self, fuzzer: str) -> Dict[Optional[str], List[Path]]:
+        '''
+        new seed paths of every instance of fuzzer, keyed by watcher instance
+        '''
+        seed_paths: Dict[Optional[str], List[Path]] = {}
+        for w in watcher.WATCHERS.get(fuzzer, []):
+            test_case_paths, self._cursor[w], missed = w.test_case_queue.read(self._cursor.get(w, 0))
+            if missed:
+                logger.warning(f'evaluator 403 - {fuzzer} {w.instance or "primary"} fell behind, {missed} seeds missed')
+            for test_case_path in test_case_paths:
+                if self._is_score_target(w, test_case_path):
+                    seed_paths.setdefault(w.instance, []).append(test_case_path)
+        return seed_paths
+
+    def evaluate_once(self):
+        batches = [(fuzzer, seed_paths, instance) for fuzzer in self.fuzzers
+                   for instance, seed_paths in self._collect(fuzzer).items()]
+        if not batches:
+            return
+        # NOTE: one launch of the score binary for every fuzzer
+        for (fuzzer, seed_paths, instance), results in zip(batches, self.service.score_all(batches)):
+            logger.info(f'evaluator 400 - {fuzzer} {instance or "primary"} new seeds : {len(seed_paths)}, scored : {len(results)}, max score : {self.max_score(fuzzer)}')
+
+    def drain(self, timeout: float):
+        '''
+        wait (at most timeout seconds) until every seed observed so far is scored
+        '''
+        deadline = time.time() + timeout
+        lengths = self._queue_lengths()
+        self._wakeup.set()
+        with self._idle:
+            while self._busy or self._pending(lengths):
+                remain = deadline - time.time()
+                if remain <= 0:
+                    logger.info('evaluator 402 - drain timeout')
+                    return False
+                self._idle.wait(min(remain, 1))
+        return True
+
+    def run(self):
+        for fuzzer in self.fuzzers:
+            self.service.load(fuzzer)
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            with self._idle:
+                self._busy = True
+            try:
+                self.evaluate_once()
+            except Exception:
+                logger.exception('evaluator 401 - background evaluation failed')
+            with self._idle:
+                self._busy = False
+                self._idle.notify_all()
+            self._wakeup.wait(self.interval)
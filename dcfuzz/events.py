@@ -0,0 +1,109 @@
+'''
+event loop driving the scheduler.
+watcher, evaluator and fuzzer monitor threads post events, the scheduler
+waits on them with timers instead of sleeping in fixed chunks.
+'''
+import enum
+import heapq
+import logging
+import queue
+import time
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger('dcfuzz.events')
+
+
+class EventType(enum.Enum):
+    CRASH = enum.auto()
+    FUZZER_EXIT = enum.auto()
+    SCORE_JUMP = enum.auto()
+    STOP = enum.auto()
+
+
+class Event(object):
+    def __init__(self, type: EventType, fuzzer: Optional[str] = None, data: Any = None):
+        self.type = type
+        self.fuzzer = fuzzer
+        self.data = data
+        self.time = time.time()
+
+    def __repr__(self):
+        return f'Event({self.type.name}, {self.fuzzer}, {self.data})'
+
+
+# return True to end the current wait early
+EventHandler = Callable[[Event], bool]
+
+
+class EventLoop(object):
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self._events: queue.Queue = queue.Queue()
+        # heap of (next_fire, seq, interval, callback)
+        self._timers: List = []
+        self._timer_seq = 0
+        self._handlers: List[EventHandler] = []
+
+    def post(self, event: Event) -> None:
+        '''
+        thread safe, called from watcher / evaluator / monitor threads
+        '''
+        self._events.put(event)
+
+    def add_timer(self, interval: float, callback: Callable[[], None]) -> None:
+        '''
+        periodic callback, run on the scheduler thread while it waits
+        '''
+        self._timer_seq += 1
+        heapq.heappush(self._timers, (time.time() + interval, self._timer_seq, interval, callback))
+
+    def add_handler(self, handler: EventHandler) -> None:
+        '''
+        handler called for every event, in every wait
+        '''
+        self._handlers.append(handler)
+
+    def is_end(self) -> bool:
+        return time.time() >= self.deadline
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.time())
+
+    def _fire_timers(self, now: float) -> None:
+        while self._timers and self._timers[0][0] <= now:
+            _, seq, interval, callback = heapq.heappop(self._timers)
+            try:
+                callback()
+            except Exception:
+                logger.exception('events 900 - timer callback failed')
+            heapq.heappush(self._timers, (now + interval, seq, interval, callback))
+
+    def _dispatch(self, event: Event, until: Optional[EventHandler]) -> bool:
+        done = False
+        for handler in self._handlers:
+            done |= bool(handler(event))
+        if until is not None:
+            done |= bool(until(event))
+        return done or event.type == EventType.STOP
+
+    def wait(self, seconds: float, until: Optional[EventHandler] = None) -> Optional[Event]:
+        '''
+        wait for seconds (never past the deadline).
+        return the event that ended the wait early, None on timeout
+        '''
+        end = min(time.time() + seconds, self.deadline)
+        while True:
+            now = time.time()
+            self._fire_timers(now)
+            if now >= end:
+                return None
+            timeout = end - now
+            if self._timers:
+                timeout = min(timeout, max(0.0, self._timers[0][0] - now))
+            try:
+                event = self._events.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            logger.info(f'events 001 - {event}')
+            if self._dispatch(event, until):
+                return event
@@ -1,4 +1,4 @@
 import os, sys
 sys.path.append(os.path.dirname(os.path.realpath(__file__)))
 
-from .main import main
+from .main import main, instances
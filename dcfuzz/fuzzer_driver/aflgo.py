@@ -1,16 +1,13 @@
 import os
-import pathlib
-import sys
-import time
 import logging
 
-import peewee
 import psutil
 
+from dcfuzz import cgroup_utils
 from dcfuzz import config as Config
 from .controller import Controller
-from .db import AFLGoModel, ControllerModel, db_proxy
-from .fuzzer import PSFuzzer, FuzzerDriverException
+from .db import AFLGoModel
+from .fuzzer import AFLFuzzer, FuzzerDriverException
 
 logger = logging.getLogger('dcfuzz.fuzzer_driver.aflgo')
 
@@ -31,9 +28,10 @@ def parse_fuzzer_stats(fuzzer_stats_file):
     return ret
 
 
-class AFLGoBase(PSFuzzer):
-    def __init__(self,seed,output,group,program,argument,cgroup_path='',pid=None):
+class AFLGoBase(AFLFuzzer):
+    def __init__(self,seed,output,group,program,argument,cgroup_path='',pid=None,instance=''):
         super().__init__(pid)
+        self.instance = instance
         self.seed = seed
         self.output = output
         self.group = group
@@ -102,8 +100,8 @@ class AFLGoBase(PSFuzzer):
         self.check()
         args = []
         if self.cgroup_path:
-            args += ['cgexec', '-g', f'cpu:{self.cgroup_path}']
-        args += [self.aflgo_command, '-i', self.seed, '-o', self.output]
+            args += cgroup_utils.get_backend().launch_prefix(self.cgroup_path)
+        args += [self.aflgo_command, '-i', self.seed] + self.gen_output_args()
         args += ['-m', 'none']
         args += ['-d']
         args += ['-z', 'exp']
@@ -126,8 +124,8 @@ class AFLGo(AFLGoBase):
         self.check()
         args = []
         if self.cgroup_path:
-            args += ['cgexec', '-g', f'cpu:{self.cgroup_path}']
-        args += [self.aflgo_command, '-i', self.seed, '-o', self.output]
+            args += cgroup_utils.get_backend().launch_prefix(self.cgroup_path)
+        args += [self.aflgo_command, '-i', self.seed] + self.gen_output_args()
         args += ['-m', 'none']
         args += ['-d']
         args += ['-z', 'exp']
@@ -139,76 +137,6 @@ class AFLGo(AFLGoBase):
         return args
 
 class AFLGOController(Controller):
-    def __init__(self, seed, output, group, program, argument, cgroup_path=''):
-        self.db = peewee.SqliteDatabase(
-                os.path.join(Config.DATABASE_DIR, 'dcfuzz-aflgo.db'))
-        self.name = 'aflgo'
-        self.seed = seed        
-        self.output = output
-        self.group = group
-        self.program = program
-        self.argument = argument
-        self.cgroup_path = cgroup_path
-        self.aflgos = []
-        self.kwargs = {
-                'seed': self.seed,
-                'output': self.output,
-                'group': self.group,
-                'program': self.program,
-                'argument': self.argument,
-                'cgroup_path' : self.cgroup_path
-        }
-
-    def init(self):
-        # logger.info(f'aflgo controller 001 - init aflgo driver')
-        db_proxy.initialize(self.db)
-        self.db.connect()
-        self.db.create_tables([AFLGoModel, ControllerModel])
-        # check select model        
-        q = AFLGoModel.select()
-        # logger.info("AFLGoModel count = %d", q.count())
-        # logger.info("DB path = %s", self.db.database)
-        # logger.info("AFLGoModel db bound = %r", AFLGoModel._meta.database)
-        
-        for fuzzer in AFLGoModel.select():
-            aflgo = AFLGo(seed=fuzzer.seed, output=fuzzer.output, group=fuzzer.group, program=fuzzer.program, argument=fuzzer.argument, cgroup_path=self.cgroup_path, pid=fuzzer.pid)
-            # logger.info(f'aflgo controller 002 - aflgo : {aflgo}')
-            self.aflgos.append(aflgo)
-
-
-    def start(self):
-        # logger.info(f'aflgo controller 003 - start aflgo driver')
-        if self.aflgos:
-            print('already started', file=sys.stderr)
-            return
-        aflgo = AFLGo(**self.kwargs)
-        aflgo.start()
-        AFLGoModel.create(**self.kwargs, pid=aflgo.pid)
-        ControllerModel.create(scale_num=1)
-        ready_path = os.path.join(self.output, 'ready')
-        pathlib.Path(ready_path).touch(mode=0o666, exist_ok=True)
-
-    def scale(self, scale_num):
-        pass
-
-    def pause(self):
-        # logger.info(f'aflgo controller 004 - pause aflgo driver')
-        for aflgo in self.aflgos:
-            aflgo.pause()
-
-    def resume(self):
-        # logger.info(f'aflgo controller 005 - resume aflgo driver')
-        '''
-        NOTE: prserve scaling
-        '''
-        controller = ControllerModel.get()
-        for aflgo in self.aflgos:
-            aflgo.resume()
-
-    def stop(self):
-        # logger.info(f'aflgo controller 006 - stop aflgo driver')
-        for aflgo in self.aflgos:
-            aflgo.stop()
-        self.db.drop_tables([AFLGoModel, ControllerModel])
-
-
+    name = 'aflgo'
+    fuzzer_class = AFLGo
+    model = AFLGoModel
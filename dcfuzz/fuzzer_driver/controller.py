@@ -1,29 +1,187 @@
-from abc import ABCMeta, abstractmethod
+import logging
+import os
+import pathlib
+
+import peewee
+
+from dcfuzz import config as Config
+from .db import ControllerModel
+from .fuzzer import FuzzerDriverException, SYNC_DIR, init_sync_dir, instance_name
+
+logger = logging.getLogger('dcfuzz.fuzzer_driver.controller')
+
+FUZZER_CONFIG = Config.CONFIG['fuzzer']
 
 
 class Controller(object):
-    __metaclass__ = ABCMeta
+    '''
+    one fuzzer's instances, the primary and its afl -S secondaries, with
+    their pids kept in a per fuzzer DB. a subclass sets
+        name          key in CONFIG['fuzzer'] and the DB file name
+        fuzzer_class  PSFuzzer subclass launching one instance
+        model         DB model, one row per instance
+    '''
+    name = ''
+    fuzzer_class = None
+    model = None
+
+    def __init__(self, seed, output, group, program, argument, cgroup_path=''):
+        self.db = peewee.SqliteDatabase(
+                os.path.join(Config.DATABASE_DIR, f'dcfuzz-{self.name}.db'))
+        self.seed = seed
+        self.output = output
+        self.group = group
+        self.program = program
+        self.argument = argument
+        self.cgroup_path = cgroup_path
+        self.fuzzers = []
+        self.scale_num = 1
+        self.models = [self.model, ControllerModel]
+        self.kwargs = {
+                'seed': self.seed,
+                'output': self.output,
+                'group': self.group,
+                'program': self.program,
+                'argument': self.argument,
+                'cgroup_path' : self.cgroup_path
+        }
+
+    @property
+    def command(self):
+        return FUZZER_CONFIG[self.name]['command']
+
+    def touch_ready(self):
+        ready_path = os.path.join(self.output, 'ready')
+        pathlib.Path(ready_path).touch(mode=0o666, exist_ok=True)
 
-    @abstractmethod
     def init(self):
-        pass
+        '''
+        NOTE: only called once, the controller stays resident in the driver
+        registry and the DB is only read here to recover running instances
+        '''
+        with self.db.bind_ctx(self.models):
+            self.db.create_tables(self.models)
+            for fuzzer in self.model.select():
+                self.fuzzers.append(self.fuzzer_class(seed=fuzzer.seed, output=fuzzer.output, group=fuzzer.group,
+                                                      program=fuzzer.program, argument=fuzzer.argument,
+                                                      cgroup_path=self.cgroup_path, pid=fuzzer.pid,
+                                                      instance=fuzzer.instance))
+            controller = ControllerModel.get_or_none()
+            if controller:
+                self.scale_num = controller.scale_num
+
+    def queue_dir(self, instance):
+        if not instance:
+            return os.path.join(self.output, 'queue')
+        return os.path.join(self.output, SYNC_DIR, instance, 'queue')
 
-    @abstractmethod
-    def start(self):
-        pass
+    def start(self, scale_num=1):
+        if self.fuzzers or os.path.isdir(self.queue_dir('')):
+            # NOTE: an interrupted run, its queue is on disk
+            self.restart(scale_num)
+            return
+        fuzzer = self.fuzzer_class(**self.kwargs)
+        fuzzer.start()
+        self.fuzzers.append(fuzzer)
+        self.scale_num = 1
+        with self.db.bind_ctx(self.models):
+            self.model.create(**self.kwargs, pid=fuzzer.pid)
+            ControllerModel.create(scale_num=1)
+        self.touch_ready()
 
-    @abstractmethod
-    def scale(self):
-        pass
+    def restart(self, scale_num=1):
+        '''
+        bring back the primary and scale_num - 1 secondaries of an interrupted
+        run. an instance from the DB that still runs is reattached, the others
+        are relaunched with afl's in-place resume (-i -) when their queue is on
+        disk, so a lost or dropped DB only costs the reattach
+        '''
+        recovered = {f.instance: f for f in self.fuzzers}
+        instances = [''] + [instance_name(i) for i in range(1, max(1, scale_num))]
+        if len(instances) > 1:
+            init_sync_dir(self.output)
+        self.fuzzers = []
+        for instance in instances:
+            fuzzer = recovered.pop(instance, None)
+            if fuzzer is not None and fuzzer.is_running(self.command):
+                # NOTE: left paused by a resumable exit
+                fuzzer.resume()
+                logger.info(f'{self.name} controller 010 - reattach {instance or "primary"} pid {fuzzer.pid}')
+            else:
+                seed = '-' if os.path.isdir(self.queue_dir(instance)) else self.seed
+                fuzzer = self.fuzzer_class(**{**self.kwargs, 'seed': seed}, instance=instance)
+                fuzzer.start()
+                logger.info(f'{self.name} controller 011 - resume {instance or "primary"} pid {fuzzer.pid}, -i {seed}')
+            self.fuzzers.append(fuzzer)
+        for fuzzer in recovered.values():
+            fuzzer.stop()
+        self.scale_num = len(instances)
+        with self.db.bind_ctx(self.models):
+            self.model.delete().execute()
+            for fuzzer in self.fuzzers:
+                self.model.create(**self.kwargs, pid=fuzzer.pid, instance=fuzzer.instance)
+            ControllerModel.delete().execute()
+            ControllerModel.create(scale_num=self.scale_num)
+        self.touch_ready()
+
+    def scale(self, scale_num):
+        '''
+        keep scale_num instances running, the primary and scale_num - 1 afl -S
+        secondaries in the same cgroup
+        '''
+        primary = next((f for f in self.fuzzers if not f.instance), None)
+        if primary is None or not primary.proc:
+            raise FuzzerDriverException
+        scale_num = max(1, scale_num)
+        if scale_num > self.scale_num:
+            init_sync_dir(self.output)
+            # NOTE: a paused fuzzer stays paused as a whole
+            is_paused = primary.is_inactive
+            for i in range(self.scale_num, scale_num):
+                instance = instance_name(i)
+                # NOTE: afl refuses a used -S output directory unless resumed
+                seed = '-' if os.path.isdir(self.queue_dir(instance)) else self.seed
+                fuzzer = self.fuzzer_class(**{**self.kwargs, 'seed': seed}, instance=instance)
+                fuzzer.start()
+                if is_paused:
+                    fuzzer.pause()
+                with self.db.bind_ctx(self.models):
+                    self.model.create(**self.kwargs, pid=fuzzer.pid, instance=fuzzer.instance)
+                self.fuzzers.append(fuzzer)
+        else:
+            for i in range(scale_num, self.scale_num):
+                instance = instance_name(i)
+                for fuzzer in [f for f in self.fuzzers if f.instance == instance]:
+                    fuzzer.stop()
+                    self.fuzzers.remove(fuzzer)
+                with self.db.bind_ctx(self.models):
+                    self.model.delete().where(self.model.instance == instance).execute()
+        self.scale_num = scale_num
+        with self.db.bind_ctx(self.models):
+            ControllerModel.update(scale_num=scale_num).execute()
 
-    @abstractmethod
     def pause(self):
-        pass
+        for fuzzer in self.fuzzers:
+            fuzzer.pause()
 
-    @abstractmethod
     def resume(self):
-        pass
+        '''
+        NOTE: prserve scaling
+        '''
+        for fuzzer in self.fuzzers:
+            fuzzer.resume()
 
-    @abstractmethod
     def stop(self):
-        pass
+        for fuzzer in self.fuzzers:
+            fuzzer.stop()
+        self.fuzzers = []
+        with self.db.bind_ctx(self.models):
+            self.db.drop_tables(self.models)
+        self.db.close()
+
+    def detach(self):
+        '''
+        leave the instances and their DB rows for a later restart
+        '''
+        self.fuzzers = []
+        self.db.close()
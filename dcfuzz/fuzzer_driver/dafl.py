@@ -1,18 +1,15 @@
 import os
-import pathlib
-import sys
-import time
 import logging
 
-import peewee
 import psutil
 
+from dcfuzz import cgroup_utils
 from dcfuzz import config as Config
 from .controller import Controller
-from .db import DAFLModel, ControllerModel, db_proxy
-from .fuzzer import PSFuzzer, FuzzerDriverException
+from .db import DAFLModel
+from .fuzzer import AFLFuzzer, FuzzerDriverException
 
-# logger = logging.getLogger('dcfuzz.fuzzer_driver.dafl')
+logger = logging.getLogger('dcfuzz.fuzzer_driver.dafl')
 
 CONFIG = Config.CONFIG
 FUZZER_CONFIG = CONFIG['fuzzer']
@@ -31,9 +28,10 @@ def parse_fuzzer_stats(fuzzer_stats_file):
     return ret
 
 
-class DAFLBase(PSFuzzer):
-    def __init__(self,seed,output,group,program,argument,cgroup_path='',pid=None):
+class DAFLBase(AFLFuzzer):
+    def __init__(self,seed,output,group,program,argument,cgroup_path='',pid=None,instance=''):
         super().__init__(pid)
+        self.instance = instance
         self.seed = seed
         self.output = output
         self.group = group
@@ -103,9 +101,9 @@ class DAFLBase(PSFuzzer):
 
         args = []
         if self.cgroup_path:
-            args += ['cgexec', '-g', f'cpu:{self.cgroup_path}']
+            args += cgroup_utils.get_backend().launch_prefix(self.cgroup_path)
 
-        args += [self.dafl_command, '-i', self.seed, '-o', self.output]
+        args += [self.dafl_command, '-i', self.seed] + self.gen_output_args()
         args += ['-m', 'none']
         args += ['-d']
         args += ['--', self.target]
@@ -124,8 +122,8 @@ class DAFL(DAFLBase):
         self.check()
         args = []
         if self.cgroup_path:
-            args += ['cgexec', '-g', f'cpu:{self.cgroup_path}']
-        args += [self.dafl_command, '-i', self.seed, '-o', self.output]
+            args += cgroup_utils.get_backend().launch_prefix(self.cgroup_path)
+        args += [self.dafl_command, '-i', self.seed] + self.gen_output_args()
         args += ['-m', 'none']
         args += ['-d']
         args += ['--', self.target]
@@ -135,76 +133,6 @@ class DAFL(DAFLBase):
         return args
 
 class DAFLController(Controller):
-    def __init__(self, seed, output, group, program, argument, cgroup_path=''):
-        self.db = peewee.SqliteDatabase(
-            os.path.join(Config.DATABASE_DIR, 'dcfuzz-dafl.db'))
-        self.name = 'dafl'
-        self.seed = seed
-        self.output = output
-        self.group = group
-        self.program = program
-        self.argument = argument
-        self.cgroup_path = cgroup_path
-        self.dafls = []
-        self.kwargs = {
-            'seed': self.seed,
-            'output': self.output,
-            'group': self.group,
-            'program': self.program,
-            'argument': self.argument,
-            'cgroup_path' : self.cgroup_path
-        }
-
-    def init(self):
-        # logger.info(f'dafl controller 001 - init dafl driver')
-        db_proxy.initialize(self.db)
-        self.db.connect()
-        self.db.create_tables([DAFLModel, ControllerModel])
-        # check select model
-        q = DAFLModel.select()
-        # logger.info("DAFLModel count = %d", q.count())
-        # logger.info("DB path = %s", self.db.database)
-        # logger.info("DAFLModel db bound = %r", DAFLModel._meta.database)
-        
-        for fuzzer in DAFLModel.select():
-            dafl = DAFL(seed=fuzzer.seed, output=fuzzer.output, group=fuzzer.group, program=fuzzer.program, argument=fuzzer.argument, cgroup_path=self.cgroup_path, pid=fuzzer.pid)
-            # logger.info(f'dafl controller 002 - dafl : {dafl}')
-            self.dafls.append(dafl)
-
-
-    def start(self):
-        # logger.info(f'dafl controller 003 - start dafl driver')
-        if self.dafls:
-            print('already started', file=sys.stderr)
-            return
-        dafl = DAFL(**self.kwargs) 
-        dafl.start()
-        DAFLModel.create(**self.kwargs, pid=dafl.pid)
-        ControllerModel.create(scale_num=1)
-        ready_path = os.path.join(self.output, 'ready')
-        pathlib.Path(ready_path).touch(mode=0o666, exist_ok=True)
-
-    def scale(self, scale_num):
-        pass
-
-    def pause(self):
-        # logger.info(f'dafl controller 004 - pause dafl driver')
-        for dafl in self.dafls:
-            dafl.pause()
-
-    def resume(self):
-        # logger.info(f'dafl controller 005 - resume dafl driver')
-        '''
-        NOTE: prserve scaling
-        '''
-        controller = ControllerModel.get()
-        for dafl in self.dafls:
-            dafl.resume()
-
-    def stop(self):
-        # logger.info(f'dafl controller 006 - stop dafl driver')
-        for dafl in self.dafls:
-            dafl.stop()
-        self.db.drop_tables([DAFLModel, ControllerModel])
-
-
+    name = 'dafl'
+    fuzzer_class = DAFL
+    model = DAFLModel
@@ -14,6 +14,7 @@ class AFLGoModel(BaseModel):
     program = peewee.CharField()
     argument = peewee.CharField()
     pid = peewee.IntegerField()
+    instance = peewee.CharField(default='')     # '' for the primary, s1.. for -S secondaries
 
 class WindRangerModel(BaseModel):
     seed = peewee.CharField()
@@ -22,6 +23,7 @@ class WindRangerModel(BaseModel):
     program = peewee.CharField()
     argument = peewee.CharField()
     pid = peewee.IntegerField()
+    instance = peewee.CharField(default='')     # '' for the primary, s1.. for -S secondaries
 
 class DAFLModel(BaseModel):
     seed = peewee.CharField()
@@ -30,6 +32,7 @@ class DAFLModel(BaseModel):
     program = peewee.CharField()
     argument = peewee.CharField()
     pid = peewee.IntegerField()
+    instance = peewee.CharField(default='')     # '' for the primary, s1.. for -S secondaries
 
 class ControllerModel(BaseModel):
     scale_num = peewee.IntegerField()
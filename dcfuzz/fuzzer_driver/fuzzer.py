@@ -1,4 +1,5 @@
 import os
+import signal
 import subprocess
 import sys
 from abc import ABCMeta, abstractmethod
@@ -14,8 +15,46 @@ class FuzzerDriverException(Exception):
     pass
 
 
-class Fuzzer(object):
-    __metaclass__ = ABCMeta
+# secondaries run as afl -S under {output}/sync, next to a link to the primary
+SYNC_DIR = 'sync'
+PRIMARY_LINK = 'primary'
+
+
+def child_pids(pid):
+    '''
+    direct children from /proc/<pid>/task/<pid>/children, no /proc scan
+    '''
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(c) for c in f.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def signal_group(pgid, sig):
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def instance_name(index):
+    return f's{index}'
+
+
+def init_sync_dir(output):
+    '''
+    {output}/sync/primary -> {output}, so -S instances import the primary queue
+    '''
+    sync_dir = os.path.join(output, SYNC_DIR)
+    os.makedirs(sync_dir, exist_ok=True)
+    primary = os.path.join(sync_dir, PRIMARY_LINK)
+    if not os.path.islink(primary):
+        os.symlink('..', primary)
+    return sync_dir
+
+
+class Fuzzer(metaclass=ABCMeta):
 
     @abstractmethod
     def run(self):
@@ -43,6 +82,8 @@ class PSFuzzer(Fuzzer):
         self.__pid = pid
         self.debug = debug
         self.debug_file = debug_file
+        self.cgroup_path = ''
+        self.__ps_proc = None
 
     @property
     def pid(self):
@@ -52,18 +93,34 @@ class PSFuzzer(Fuzzer):
     def proc(self):
         '''
         method to retrive process based on psutils
+        NOTE: the psutil handle is cached, is_running() also catches pid reuse
         '''
-        proc = None
-        
         if not self.pid:
             return None
+        proc = self.__ps_proc
+        if proc is not None and proc.pid == self.pid and proc.is_running():
+            return proc
         if psutil.pid_exists(self.pid):
             proc = psutil.Process(pid=self.pid)
         else:
             return None
         #logger.info(f'fuzzer_driver fuzzer 001 - pid : {self.pid}, pid_exists={psutil.pid_exists(self.pid)}')
+        self.__ps_proc = proc
         return proc
 
+    def is_running(self, command):
+        '''
+        the pid is alive and still runs command, a pid from the DB of an
+        earlier run may have been reused after a reboot
+        '''
+        proc = self.proc
+        if proc is None:
+            return False
+        try:
+            return command in proc.cmdline() and proc.status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+
     @abstractmethod
     def gen_cwd(self):
         return None
@@ -97,6 +154,7 @@ class PSFuzzer(Fuzzer):
                 proc = subprocess.Popen(args,
                                         env=env,
                                         cwd=cwd,
+                                        start_new_session=True,
                                         stdin=subprocess.DEVNULL,
                                         stdout=f,
                                         stderr=subprocess.STDOUT)
@@ -104,6 +162,7 @@ class PSFuzzer(Fuzzer):
             proc = subprocess.Popen(args,
                                     env=env,
                                     cwd=cwd,
+                                    start_new_session=True,
                                     stdin=subprocess.DEVNULL,
                                     stdout=subprocess.DEVNULL,
                                     stderr=subprocess.DEVNULL)
@@ -122,10 +181,40 @@ class PSFuzzer(Fuzzer):
             return
         self.run()
 
+    def process_groups(self):
+        '''
+        afl-fuzz leads its own group (start_new_session). the fork server
+        calls setsid(), so it and the targets it forks make a second group.
+        None for a fuzzer started without its own group (recovered from an
+        older run)
+        '''
+        try:
+            if os.getpgid(self.pid) != self.pid:
+                return None
+        except ProcessLookupError:
+            return []
+        return [self.pid] + child_pids(self.pid)
+
+    def signal_groups(self, sig):
+        '''
+        one killpg per group, a target forked meanwhile is in the group too
+        '''
+        groups = self.process_groups()
+        if groups is None:
+            return False
+        # NOTE: stop afl-fuzz before its fork server, resume it after
+        if sig == signal.SIGCONT:
+            groups = groups[::-1]
+        for pgid in groups:
+            signal_group(pgid, sig)
+        return True
+
     def pause(self):
         logger.info(f'fuzzer_driver fuzzer 003 pause')
         if not self.proc:
             raise FuzzerDriverException
+        if self.signal_groups(signal.SIGSTOP):
+            return
         for child in self.proc.children(recursive=True):
             try:
                 child.suspend()
@@ -137,6 +226,8 @@ class PSFuzzer(Fuzzer):
         logger.info(f'fuzzer_driver fuzzer 004 resume')
         if not self.proc:
             raise FuzzerDriverException
+        if self.signal_groups(signal.SIGCONT):
+            return
         for child in self.proc.children(recursive=True):
             try:
                 child.resume()
@@ -149,9 +240,22 @@ class PSFuzzer(Fuzzer):
         if not self.proc:
             # NOTE: no need to raise exception, maybe fuzzer just timeout
             return
+        if self.signal_groups(signal.SIGKILL):
+            return
         for child in self.proc.children(recursive=True):
             try:
                 child.kill()
             except psutil.NoSuchProcess:
                 pass
         self.proc.kill()
+
+
+class AFLFuzzer(PSFuzzer):
+    '''
+    afl based fuzzer, the primary or one afl -S secondary of it
+    '''
+    def gen_output_args(self):
+        if not self.instance:
+            return ['-o', self.output]
+        # NOTE: secondary, afl writes to {output}/sync/{instance}
+        return ['-o', os.path.join(self.output, SYNC_DIR), '-S', self.instance]
@@ -3,14 +3,32 @@ import argparse
 import os
 import sys
 import logging
+from typing import Dict, List, Tuple
 
 # sys.path.append(os.path.dirname(os.path.realpath(__file__)))
 from .aflgo import AFLGOController
 from .dafl import DAFLController
 from .windranger import WINDRANGERController
+from .controller import Controller
 
 logger = logging.getLogger('dcfuzz.fuzzer_driver.main')
 
+# resident controllers keyed by (fuzzer, output), a pause / resume only
+# signals the known pids. the DB is read once per controller, to recover
+# fuzzers started before a restart
+CONTROLLERS: Dict[Tuple[str, str], Controller] = {}
+
+
+def instances(fuzzer, output) -> List[Tuple[str, int, bool]]:
+    '''
+    (instance, pid, running) of every instance the resident controller of
+    fuzzer runs, the primary is instance ''
+    '''
+    controller = CONTROLLERS.get((fuzzer, os.path.realpath(output)))
+    if controller is None:
+        return []
+    return [(f.instance, f.pid, f.is_running(controller.command)) for f in controller.fuzzers]
+
 
 def str_to_class(classname):
     return getattr(sys.modules[__name__], classname, None)
@@ -41,6 +59,7 @@ def parse_args(raw_args=None):
     sp = p.add_subparsers(dest='command', help="command", required=True)
     sp.add_parser('start')
     sp.add_parser('stop')
+    sp.add_parser('detach')
     sp.add_parser('pause')
     sp.add_parser('resume')
     p_scale = sp.add_parser('scale')
@@ -66,22 +85,31 @@ def main(fuzzer,
 
     #logger.info(f'fuzzer_driver 001 - controller_class : {controller_class}')
 
-    controller = controller_class(seed=os.path.realpath(seed),
-                                  output=os.path.realpath(output),
-                                  group=group,
-                                  program=program,
-                                  argument=argument,
-                                  cgroup_path=cgroup_path)
-
-    controller.init()
+    output = os.path.realpath(output)
+    key = (fuzzer, output)
+    controller = CONTROLLERS.get(key)
+    if controller is None:
+        controller = controller_class(seed=os.path.realpath(seed),
+                                      output=output,
+                                      group=group,
+                                      program=program,
+                                      argument=argument,
+                                      cgroup_path=cgroup_path)
+
+        controller.init()
+        CONTROLLERS[key] = controller
     command = command
     
     #logger.info(f'fuzzer_driver 002 - command : {command}')
 
     if command == 'start':
-        controller.start()
+        controller.start(scale_num)
     elif command == 'stop':
         controller.stop()
+        CONTROLLERS.pop(key, None)
+    elif command == 'detach':
+        controller.detach()
+        CONTROLLERS.pop(key, None)
     elif command == 'pause':
         controller.pause()
     elif command == 'resume':
@@ -100,4 +128,4 @@ if __name__ == '__main__':
          argument=args.args,
          thread=args.jobs,
          command=args.command,
-         scale_num=args.scale_num)
+         scale_num=getattr(args, 'scale_num', 1))
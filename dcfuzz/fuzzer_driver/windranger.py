@@ -1,19 +1,16 @@
 import os
-import pathlib
-import sys
-import time
 import logging
 import shutil
 
-import peewee
 import psutil
 
+from dcfuzz import cgroup_utils
 from dcfuzz import config as Config
 from .controller import Controller
-from .db import WindRangerModel, ControllerModel, db_proxy
-from .fuzzer import PSFuzzer, FuzzerDriverException
+from .db import WindRangerModel
+from .fuzzer import AFLFuzzer, FuzzerDriverException
 
-# logger = logging.getLogger('dcfuzz.fuzzer_driver.windranger')
+logger = logging.getLogger('dcfuzz.fuzzer_driver.windranger')
 
 CONFIG = Config.CONFIG
 FUZZER_CONFIG = CONFIG['fuzzer']
@@ -32,9 +29,10 @@ def parse_fuzzer_stats(fuzzer_stats_file):
     return ret
 
 
-class WindrangerBase(PSFuzzer):
-    def __init__(self,seed,output,group,program,argument,cgroup_path='',pid=None):
+class WindrangerBase(AFLFuzzer):
+    def __init__(self,seed,output,group,program,argument,cgroup_path='',pid=None,instance=''):
         super().__init__(pid)
+        self.instance = instance
         self.seed = seed
         self.output = output
         self.group = group
@@ -104,9 +102,9 @@ class WindrangerBase(PSFuzzer):
 
         args = []
         if self.cgroup_path:
-            args += ['cgexec', '-g', f'cpu:{self.cgroup_path}']
+            args += cgroup_utils.get_backend().launch_prefix(self.cgroup_path)
 
-        args += [self.windranger_command, '-i', self.seed, '-o', self.output]
+        args += [self.windranger_command, '-i', self.seed] + self.gen_output_args()
         args += ['-m', 'none']
         args += ['-d']
         args += ['--', self.target]
@@ -125,8 +123,8 @@ class Windranger(WindrangerBase):
         self.check()
         args = []
         if self.cgroup_path:
-            args += ['cgexec', '-g', f'cpu:{self.cgroup_path}']
-        args += [self.windranger_command, '-i', self.seed, '-o', self.output]
+            args += cgroup_utils.get_backend().launch_prefix(self.cgroup_path)
+        args += [self.windranger_command, '-i', self.seed] + self.gen_output_args()
         args += ['-m', 'none']
         args += ['-d']
         args += ['--', self.target]
@@ -136,79 +134,13 @@ class Windranger(WindrangerBase):
         return args    
 
 class WINDRANGERController(Controller):
-    def __init__(self, seed, output, group, program, argument,  cgroup_path=''):
-        self.db = peewee.SqliteDatabase(
-            os.path.join(Config.DATABASE_DIR, 'dcfuzz-windranger.db'))
-        self.name = 'windranger'
-        self.seed = seed
-        self.output = output
-        self.group = group
-        self.program = program
-        self.argument = argument
-        self.cgroup_path = cgroup_path
-        self.windrangers = []
-        self.kwargs = {
-            'seed': self.seed,
-            'output': self.output,
-            'group': self.group,
-            'program': self.program,
-            'argument': self.argument,
-            'cgroup_path' : self.cgroup_path
-        }
+    name = 'windranger'
+    fuzzer_class = Windranger
+    model = WindRangerModel
 
     def init(self):
-        # logger.info(f'windranger controller 001 - init windranger driver')
-        db_proxy.initialize(self.db)
-        self.db.connect()
-        self.db.create_tables([WindRangerModel, ControllerModel])
-        # check select model
-        q = WindRangerModel.select()
-        # logger.info("WindRangerModel count = %d", q.count())
-        # logger.info("DB path = %s", self.db.database)
-        # logger.info("WindRangerModel db bound = %r", WindRangerModel._meta.database)
-
-        # copy distance
         self.copy_distance()
-
-        for fuzzer in WindRangerModel.select():
-            windranger = Windranger(seed=fuzzer.seed, output=fuzzer.output, group=fuzzer.group, program=fuzzer.program, argument=fuzzer.argument, cgroup_path=self.cgroup_path, pid=fuzzer.pid)
-            # logger.info(f'windranger controller 002 - windranger : {windranger}')
-            self.windrangers.append(windranger)
-            
-    def start(self):
-        # logger.info(f'windranger controller 003 - start windranger driver')
-        if self.windrangers:
-            print('already started', file=sys.stderr)
-            return
-        windranger = Windranger(**self.kwargs)
-        windranger.start()
-        WindRangerModel.create(**self.kwargs, pid=windranger.pid)
-        ControllerModel.create(scale_num=1)
-        ready_path = os.path.join(self.output, 'ready')
-        pathlib.Path(ready_path).touch(mode=0o666, exist_ok=True)
-
-    def scale(self, scale_num):
-        pass
-
-    def pause(self):
-        # logger.info(f'windranger controller 004 - pause windranger driver')
-        for windranger in self.windrangers:
-            windranger.pause()
-
-    def resume(self):
-        # logger.info(f'windranger controller 005 - resume windranger driver')
-        '''
-        NOTE: prserve scaling
-        '''
-        controller = ControllerModel.get()
-        for windranger in self.windrangers:
-            windranger.resume()
-
-    def stop(self):
-        # logger.info(f'windranger controller 006 - stop windranger driver')
-        for windranger in self.windrangers:
-            windranger.stop()
-        self.db.drop_tables([WindRangerModel, ControllerModel])
+        super().init()
 
     def copy_distance(self):
         # logger.info(f'windranger controller 666 - copy distance')
@@ -231,5 +163,3 @@ class WINDRANGERController(Controller):
 
         if not os.path.exists(dst_condition):
             shutil.copy(src_condition, dst_condition)
-
-
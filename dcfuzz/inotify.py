@@ -0,0 +1,144 @@
+'''
+minimal inotify binding through ctypes, linux only.
+a file is reported once its writer closed it (IN_CLOSE_WRITE), once it
+was moved in complete (IN_MOVED_TO) or hard linked in (IN_CREATE of a name
+with more than one link, afl's link_or_copy into a secondary's queue),
+never while it is half written.
+'''
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger('dcfuzz.inotify')
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+_EVENT = struct.Struct('iIII')
+
+_libc = None
+
+
+def _load():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def _error(what: str) -> OSError:
+    err = ctypes.get_errno()
+    return OSError(err, f'{what}: {os.strerror(err)}')
+
+
+def available() -> bool:
+    try:
+        libc = _load()
+    except (OSError, AttributeError):
+        return False
+    fd = libc.inotify_init1(IN_CLOEXEC)
+    if fd < 0:
+        return False
+    os.close(fd)
+    return True
+
+
+class InotifyObserver(threading.Thread):
+    '''
+    one inotify fd for a set of directories, same start / stop / is_alive
+    interface as the watchdog observer.
+    callback(path) runs on this thread for every complete file, on_overflow()
+    when the kernel event queue overflowed and events were lost.
+    '''
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+    POLL_TIMEOUT = 0.5  # seconds, how fast stop() is noticed
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, callback: Callable[[Path], None],
+                 on_overflow: Optional[Callable[[], None]] = None):
+        super().__init__(daemon=True)
+        self._libc = _load()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise _error('inotify_init1')
+        self._dirs: Dict[int, str] = {}
+        self._callback = callback
+        self._on_overflow = on_overflow
+        self._stopping = threading.Event()
+
+    def schedule(self, directory) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), self.MASK)
+        if wd < 0:
+            raise _error(f'inotify_add_watch {directory}')
+        self._dirs[wd] = str(directory)
+
+    def _parse(self, data: bytes) -> Iterator[Optional[Path]]:
+        '''
+        paths of the complete files in one read, None for a queue overflow
+        '''
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                yield None
+            elif mask & IN_IGNORED:
+                # NOTE: the directory was removed, its watch is gone
+                self._dirs.pop(wd, None)
+            elif name and not mask & IN_ISDIR and wd in self._dirs:
+                path = Path(self._dirs[wd], os.fsdecode(name))
+                # NOTE: a created file is reported on its close, a hard link
+                # is complete and never closed
+                if mask & IN_CREATE and not self._linked(path):
+                    continue
+                yield path
+
+    @staticmethod
+    def _linked(path: Path) -> bool:
+        try:
+            return os.stat(path).st_nlink > 1
+        except FileNotFoundError:
+            return False
+
+    def run(self) -> None:
+        poller = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        try:
+            while not self._stopping.is_set():
+                if not poller.poll(self.POLL_TIMEOUT * 1000):
+                    continue
+                try:
+                    data = os.read(self._fd, self.BUFFER_SIZE)
+                except BlockingIOError:
+                    continue
+                for path in self._parse(data):
+                    if path is not None:
+                        self._callback(path)
+                    elif self._on_overflow:
+                        logger.warning(f'inotify 001 - event queue overflow on {list(self._dirs.values())}')
+                        self._on_overflow()
+        finally:
+            os.close(self._fd)
+
+    def stop(self) -> None:
+        self._stopping.set()
@@ -16,14 +16,17 @@ import traceback
 
 from abc import abstractmethod
 from pathlib import Path
-from typing import Dict, List, Optional
-from cgroupspy import trees
+from typing import Dict, List, Optional, Set, Tuple
 from collections import defaultdict
 
+import psutil
+
 
 from . import cgroup_utils, cli
 from . import config as Config
-from . import fuzzer_driver, sync, evaluator, thompson #, fuzzing
+from . import bandit, checkpoint, collector, fuzzer_driver, pausebench, policy, runlog, slicing, sync, evaluator, seedstore, thompson, watcher #, fuzzing
+from .events import Event, EventLoop, EventType
+from .mytype import SeedType
 from .common import nested_dict, IS_PROFILE, IS_DEBUG
 from .singleton import SingletonABCMeta
 
@@ -40,6 +43,8 @@ START_TIME: float = 0.0
 config: Dict = Config.CONFIG
 OUTPUT: Path
 EVALUTOR_DIR : Path
+SCORE_SERVICE: Optional[evaluator.ScoreService] = None
+EVALUATOR: Optional[evaluator.EvaluationPipeline] = None
 INPUT: Optional[Path]
 LOG_DATETIME: str
 LOG_FILE_NAME: str
@@ -49,14 +54,29 @@ PREP_TIME: int
 FOCUS_TIME: int
 START_TIME:float = 0.0
 
-SLEEP_GRANULARITY: int = 60
+EVENTS: Optional[EventLoop] = None
+EXITED_FUZZERS = set()
+# (fuzzer, instance, pid) already reported, a relaunched instance has a new pid
+EXITED_INSTANCES: Set[Tuple[str, str, int]] = set()
+MONITOR_INTERVAL: float = 1
+# running instances per fuzzer, the primary plus afl -S secondaries
+SCALE_NUM: Dict[str, int] = {}
 
 RUNNING: bool = False
+# set by SIGINT / SIGTERM, only then are the fuzzers left for --resume
+INTERRUPTED: bool = False
 
 FUZZERS: List[str]= []
 TARGET: str
 CPU_ASSIGN: Dict[str, float] = {}
 CGROUP_ROOT = ''
+SCORE_CGROUP = ''
+CGROUP_MANAGER: Optional[cgroup_utils.CgroupManager] = None
+SLOT_METER: Optional[pausebench.SlotMeter] = None
+COLLECTOR: Optional[collector.StatsCollector] = None
+SCHEDULER = None
+# cpu seconds and executions every fuzzer got in its slots so far
+FUZZER_USAGE: Dict[str, Dict[str, float]] = defaultdict(lambda: {'cpu': 0.0, 'execs': 0.0})
 
 ARGS: cli.ArgsParser
 
@@ -68,12 +88,11 @@ def terminate_dcfuzz():
 def is_end():
     logger.info('main 900 - check end time')
     global START_TIME
-    diff = 60
     current_time = time.time()
     elasp = current_time - START_TIME
     timeout_seconds = TIMEOUT
     logger.info(f'main 99999 - elasp : {elasp}, timeout_seconds :{timeout_seconds}, current_time : {current_time}, START_TIME : {START_TIME} ')
-    return elasp >= timeout_seconds + diff
+    return elasp >= timeout_seconds
 
 
 
@@ -85,22 +104,135 @@ def check_fuzzer_ready_one(fuzzer):
         return False
     return True
 
-def sleep(seconds: int, log=False):
+def sleep(seconds: int, log=False, until=None):
     logger.info(f'main 901 -  sleep time: {seconds}, log: {log}')
     '''
-    hack to early return
+    wait on the event loop, return early at TIMEOUT or when until(event) is True
     '''
-    global SLEEP_GRANULARITY
+    global EVENTS
     if log:
         logger.info(f'main 902 - sleep {seconds} seconds')
     else:
         logger.debug(f' sleep {seconds} seconds')
-    remain = seconds
-    while remain and not is_end():
-        t = min(remain, SLEEP_GRANULARITY)
-        # logger.info(f'main 903 - remain: {remain}, SLEEP_GRAUNLARITY: {SLEEP_GRANULARITY}, t : {t}')
-        time.sleep(t)
-        remain -= t
+    event = EVENTS.wait(seconds, until=until)
+    if event:
+        logger.info(f'main 903 - sleep end early by {event}')
+    return event
+
+def run_slot(seconds, run_fuzzers):
+    '''
+    let run_fuzzers run for one time slot, recorded for the pause benchmark
+    '''
+    global SLOT_METER
+    slot_start = time.time()
+    SLOT_METER.begin()
+    event = sleep(seconds, until=slot_end_on(run_fuzzers))
+    cpu = SLOT_METER.end(run_fuzzers)
+    log_slot_stats(run_fuzzers, slot_start, time.time(), cpu)
+    return event
+
+def log_slot_stats(run_fuzzers, slot_start, slot_end, cpu):
+    '''
+    what every running fuzzer got out of its cpu slice, from the collector
+    '''
+    global COLLECTOR, FUZZER_USAGE, CPU_ASSIGN
+    for fuzzer in run_fuzzers:
+        stats = COLLECTOR.slot(fuzzer, slot_start, slot_end)
+        stats['cpu'] = cpu.get(fuzzer)
+        # NOTE: without cgroup accounting, assume the quota was used up
+        used = stats['cpu'] if stats['cpu'] is not None else (slot_end - slot_start) * CPU_ASSIGN.get(fuzzer, 1)
+        FUZZER_USAGE[fuzzer]['cpu'] += used
+        FUZZER_USAGE[fuzzer]['execs'] += stats['execs']
+        stats['execs_per_cpu'] = stats['execs'] / stats['cpu'] if stats['cpu'] else None
+        logger.info(f"main 120 - slot {fuzzer} : execs {stats['execs']:.0f}, execs/s {stats['execs_per_sec']:.1f}, "
+                    f"execs/cpu-s {stats['execs_per_cpu']}, new paths {stats['new_paths']:.0f}, new crashes {stats['new_crashes']:.0f}")
+        runlog.event('slot', fuzzer=fuzzer, start=slot_start, end=slot_end, cpu_assign=CPU_ASSIGN.get(fuzzer), **stats)
+
+def log_memory():
+    '''
+    rss and the size of the sync / seed store bookkeeping, once per round
+    '''
+    stats = {'rss': psutil.Process().memory_info().rss, **sync.memory_stats()}
+    logger.info(f'main 130 - memory : {stats}')
+    runlog.event('memory', **stats)
+
+def slot_end_on(run_fuzzers):
+    '''
+    end the current slot as soon as one of the running fuzzers dies or finds
+    its first crash, the target is reached and the slot has its answer.
+    NOTE: SCORE_JUMP stays passive. new bests are frequent early on and only
+    arrive once the background scorer caught up, ending slots on them would
+    cut every slot down to the scorer latency
+    '''
+    def handler(event):
+        if event.fuzzer not in run_fuzzers:
+            return False
+        if event.type == EventType.FUZZER_EXIT:
+            # NOTE: a dead secondary only costs cores, the fuzzer goes on
+            return not event.data['instance']
+        # NOTE: record_event runs first and keeps the first crash in LOG
+        return event.type == EventType.CRASH and LOG['crash'][event.fuzzer]['test_case'] == event.data
+    return handler
+
+def check_fuzzer_alive():
+    '''
+    timer on the event loop, post FUZZER_EXIT once per dead instance, the
+    pids come from the driver's controllers. the fuzzer counts as exited
+    once its primary is gone
+    '''
+    global FUZZERS, EXITED_FUZZERS, EXITED_INSTANCES, EVENTS, ARGS, TARGET
+    for fuzzer in FUZZERS:
+        if fuzzer in EXITED_FUZZERS:
+            continue
+        output = os.path.join(os.path.realpath(ARGS.output), TARGET, fuzzer)
+        for instance, pid, running in fuzzer_driver.instances(fuzzer, output):
+            if running or (fuzzer, instance, pid) in EXITED_INSTANCES:
+                continue
+            EXITED_INSTANCES.add((fuzzer, instance, pid))
+            if not instance:
+                EXITED_FUZZERS.add(fuzzer)
+            EVENTS.post(Event(EventType.FUZZER_EXIT, fuzzer, {'instance': instance, 'pid': pid}))
+
+def watch_crash(fuzzer, w):
+    def listener(test_case_path):
+        if EVENTS is None or not test_case_path.name.startswith('id:'):
+            return
+        if w._get_test_case_type(test_case_path) == SeedType.CRASH:
+            EVENTS.post(Event(EventType.CRASH, fuzzer, str(test_case_path)))
+    w.listeners.append(listener)
+
+def record_event(event):
+    '''
+    global handler, keep first crash / exit / score jump times in LOG
+    '''
+    global START_TIME
+    elasp = event.time - START_TIME
+    if event.type == EventType.CRASH:
+        runlog.event('crash', fuzzer=event.fuzzer, test_case=event.data)
+        if event.fuzzer not in LOG['crash']:
+            LOG['crash'][event.fuzzer] = {'time': elasp, 'test_case': event.data}
+            logger.info(f'main 904 - first crash of {event.fuzzer} at {elasp} : {event.data}')
+    elif event.type == EventType.FUZZER_EXIT:
+        instance = event.data['instance']
+        runlog.event('exit', fuzzer=event.fuzzer, **event.data)
+        if instance:
+            logger.warning(f"main 905.5 - {event.fuzzer} {instance} (pid {event.data['pid']}) exited at {elasp}")
+        else:
+            LOG['exit'][event.fuzzer] = elasp
+            logger.critical(f"main 905 - {event.fuzzer} (pid {event.data['pid']}) exited at {elasp}")
+    elif event.type == EventType.SCORE_JUMP:
+        logger.info(f'main 906 - {event.fuzzer} score jump to {event.data} at {elasp}')
+        runlog.event('best', fuzzer=event.fuzzer, score=event.data)
+    return False
+
+def init_events():
+    global EVENTS, START_TIME, TIMEOUT, SCORE_SERVICE, MONITOR_INTERVAL
+    EVENTS = EventLoop(deadline=START_TIME + TIMEOUT)
+    EVENTS.add_handler(record_event)
+    EVENTS.add_timer(MONITOR_INTERVAL, check_fuzzer_alive)
+    EVENTS.add_timer(config['runlog']['flush_interval'], runlog.RUNLOG.flush)
+    SCORE_SERVICE.board.listeners.append(
+        lambda fuzzer, record: EVENTS.post(Event(EventType.SCORE_JUMP, fuzzer, record.score)))
 
 def gen_fuzzer_driver_args(fuzzer: str,
                            jobs=1,
@@ -160,6 +292,8 @@ def start(fuzzer: str, output_dir, timeout, input_dir=None):
     kw = gen_fuzzer_driver_args(fuzzer=fuzzer, input_dir=input_dir)
 
     kw['command'] = 'start'
+    # NOTE: on --resume the driver brings back the secondaries of the checkpoint
+    kw['scale_num'] = SCALE_NUM.get(fuzzer, 1)
 
     # logger.info(f'main 102 - start func kw : {kw}')
 
@@ -170,6 +304,9 @@ def pause(fuzzer, jobs=1, input_dir=None):
     call Fuzzer API to pause fuzzer
     '''
     # logger.info(f'main 103 - pause function {fuzzer}')
+    if ARGS.pause_mode == 'freeze':
+        CGROUP_MANAGER.freeze(fuzzer)
+        return
 
     kw = gen_fuzzer_driver_args(fuzzer=fuzzer, input_dir=input_dir)
 
@@ -184,6 +321,9 @@ def resume(fuzzer, jobs=1, input_dir=None):
     call Fuzzer API to resume fuzzer
     '''
     # logger.info(f'main 105 - resume function {fuzzer}')
+    if ARGS.pause_mode == 'freeze':
+        CGROUP_MANAGER.thaw(fuzzer)
+        return
     
     kw = gen_fuzzer_driver_args(fuzzer=fuzzer, jobs=1, input_dir=input_dir)
 
@@ -198,6 +338,9 @@ def stop(fuzzer, jobs=1, input_dir=None):
     call Fuzzer API to stop fuzzer
     '''
     # logger.info(f'main 107 - stop function {fuzzer}')
+    if CGROUP_MANAGER is not None:
+        # NOTE: a v1 frozen task only dies once thawed
+        CGROUP_MANAGER.thaw(fuzzer)
     
     kw = gen_fuzzer_driver_args(fuzzer=fuzzer,jobs=1, input_dir=input_dir)
 
@@ -207,6 +350,57 @@ def stop(fuzzer, jobs=1, input_dir=None):
 
     fuzzer_driver.main(**kw)
 
+def detach(fuzzer, input_dir=None):
+    '''
+    pause fuzzer and keep its driver DB, for --resume
+    '''
+    try:
+        pause(fuzzer=fuzzer, input_dir=input_dir)
+    except Exception:
+        # NOTE: an exited instance is relaunched by --resume anyway
+        logger.exception(f'main 669 - pause {fuzzer} before detach')
+    kw = gen_fuzzer_driver_args(fuzzer=fuzzer, jobs=1, input_dir=input_dir)
+
+    kw['command'] = 'detach'
+
+    fuzzer_driver.main(**kw)
+
+def scale(fuzzer, scale_num, input_dir=None):
+    '''
+    call Fuzzer API to run scale_num instances of fuzzer
+    '''
+    kw = gen_fuzzer_driver_args(fuzzer=fuzzer, jobs=1, input_dir=input_dir)
+
+    kw['command'] = 'scale'
+    kw['scale_num'] = scale_num
+
+    fuzzer_driver.main(**kw)
+
+def scale_up(fuzzer, scale_num):
+    '''
+    add secondaries until fuzzer runs scale_num instances, and watch them
+    NOTE: never scales down, afl refuses to reuse an old -S output directory
+    '''
+    global SCALE_NUM, OUTPUT, TARGET, INPUT
+    current = SCALE_NUM.get(fuzzer, 1)
+    if scale_num <= current:
+        return
+    logger.info(f'main 111 - scale {fuzzer} : {current} -> {scale_num}')
+    scale(fuzzer, scale_num, input_dir=INPUT)
+    SCALE_NUM[fuzzer] = scale_num
+    watch_instances(fuzzer, current, scale_num)
+
+def watch_instances(fuzzer, start, end):
+    '''
+    watchers and stats for the secondaries s{start} .. s{end - 1}
+    '''
+    global OUTPUT, TARGET, COLLECTOR
+    for i in range(start, end):
+        instance = f's{i}'
+        watcher.init_watcher(fuzzer, OUTPUT / TARGET / fuzzer / 'sync' / instance, instance=instance)
+        COLLECTOR.add(fuzzer, OUTPUT / TARGET / fuzzer / 'sync' / instance, instance=instance)
+        watch_crash(fuzzer, watcher.WATCHERS[fuzzer][-1])
+
 
 # sync the seed and remove depulicated seed 
 def do_sync(fuzzers: List[str], host_root_dir: Path) -> bool:
@@ -216,62 +410,86 @@ def do_sync(fuzzers: List[str], host_root_dir: Path) -> bool:
     #    return False
     start_time = time.time()
     logger.info(f'main 110 - TARGET : {TARGET}, fuzzers : {fuzzers}, host_root_dir : {host_root_dir}')
-    sync.sync2(TARGET, fuzzers, host_root_dir)
+    counts = sync.sync2(TARGET, fuzzers, host_root_dir, mode=ARGS.sync_mode, service=SCORE_SERVICE)
     end_time = time.time()
     diff = end_time - start_time
+    runlog.event('sync', seconds=diff, **counts)
     if IS_PROFILE: logger.info(f'main 110 - sync take {diff} seconds')
     #coverage.sync()
     return True
 
 def set_fuzzer_cgroup(fuzzer, new_cpu):
-    global CGROUPR_ROOT
-    p = os.path.join('/cpu', CGROUP_ROOT[1:], fuzzer)
-    t = trees.Tree()
-    fuzzer_cpu_node = t.get_node_by_path(p)
-    cfs_period_us = fuzzer_cpu_node.controller.cfs_period_us
-    quota = int(cfs_period_us * new_cpu)
-    # NOTE: minimal possible number for cgroup
-    if quota < 1000:
-        quota = 1000
-    logger.debug(f'set fuzzer cgroup {fuzzer} {new_cpu} {quota}')
-    fuzzer_cpu_node.controller.cfs_quota_us = quota
+    global CGROUP_MANAGER
+    CGROUP_MANAGER.set_limit(fuzzer, new_cpu)
+    logger.debug(f'set fuzzer cgroup {fuzzer} {new_cpu} {CGROUP_MANAGER.quota[fuzzer]}')
 
 
-def update_fuzzer_limit(fuzzer, new_cpu):
+def update_fuzzer_limits(cpu_assign: Dict[str, float]):
+    '''
+    pause the fuzzers going to 0, write every quota in one pass, then resume
+    the fuzzers coming back from 0
+    '''
     logger.info('main 400 - update fuzzer limit start')
-    global ARGS, CPU_ASSIGN, INPUT
-    if fuzzer not in CPU_ASSIGN: return
-    if math.isclose(CPU_ASSIGN[fuzzer], new_cpu):
-        return
-    is_pause = math.isclose(0, new_cpu)
-    # logger.info(f'main 401 - is_pause : {is_pause}')
-
-    if is_pause:        
-        # print('update pause')
-        pause(fuzzer=fuzzer, jobs=1, input_dir=INPUT)
+    global ARGS, CPU_ASSIGN, INPUT, CGROUP_MANAGER
+    quotas = {}
+    to_resume = []
+    for fuzzer, new_cpu in cpu_assign.items():
+        if fuzzer not in CPU_ASSIGN: continue
+        if math.isclose(CPU_ASSIGN[fuzzer], new_cpu):
+            continue
+        is_pause = math.isclose(0, new_cpu)
+
+        if is_pause:
+            pause(fuzzer=fuzzer, jobs=1, input_dir=INPUT)
+        # previous 0
+        elif math.isclose(CPU_ASSIGN[fuzzer], 0):
+            to_resume.append(fuzzer)
+
+        CPU_ASSIGN[fuzzer] = new_cpu
+        if not is_pause:
+            quotas[fuzzer] = new_cpu
+        elif ARGS.pause_mode == 'signal':
+            # NOTE: a stopped fuzzer keeps 1%, a frozen one needs no quota
+            quotas[fuzzer] = 0.01
+
+    written = CGROUP_MANAGER.set_limits(quotas)
+    logger.debug(f'set fuzzer cgroup {quotas}, {written} written')
+    if quotas:
+        runlog.event('quota', quotas=quotas, written=written, resume=to_resume)
+
+    for fuzzer in to_resume:
+        resume(fuzzer=fuzzer, jobs=1, input_dir=ARGS.input)
 
-    # previous 0
-    if math.isclose(CPU_ASSIGN[fuzzer], 0) and new_cpu != 0:
-        # logger.info(f'main 401.5 - resume start')
-        resume(fuzzer=fuzzer, jobs=1, input_dir=ARGS.input)  
-
-    CPU_ASSIGN[fuzzer] = new_cpu
-
-    # setup cgroup
-    if not is_pause:
-        set_fuzzer_cgroup(fuzzer, new_cpu)
-    else:
-        # give 1%
-        set_fuzzer_cgroup(fuzzer, 0.01)
-    # logger.info('main 402 - update fuzzer limit end')
+def update_fuzzer_limit(fuzzer, new_cpu):
+    update_fuzzer_limits({fuzzer: new_cpu})
 
 def cleanup(exit_code=0):
     global ARGS
     logger.info('main 666 - cleanup')
     LOG['end_time'] = time.time()
+    resumable = False
+    if RUNNING:
+        try:
+            save_checkpoint()
+            # NOTE: stopped by a signal before the timeout, --resume picks the
+            # fuzzers up again. a crash of dcfuzz itself still kills them
+            resumable = INTERRUPTED and not is_end()
+        except Exception:
+            logger.exception('main 667 - checkpoint failed')
+    if COLLECTOR:
+        COLLECTOR.stop()
+        LOG['stats'] = COLLECTOR.as_dict()
     write_log()
+    if runlog.RUNLOG:
+        runlog.event('run_end', exit_code=exit_code)
+        runlog.RUNLOG.close()
     for fuzzer in FUZZERS:
-       stop(fuzzer)
+        if resumable:
+            detach(fuzzer)
+        else:
+            stop(fuzzer)
+    if resumable:
+        logger.info('main 668 - fuzzers left paused, continue with --resume')
     #if exit_code == 0 and ARGS.tar:
     #    save_tar()
     os._exit(exit_code)
@@ -280,6 +498,54 @@ def cleanup_exception(etype, value, tb):
     #traceback.print_exception(etype, value, tb)
     cleanup(1)
 
+def save_checkpoint():
+    '''
+    everything --resume needs that is not already on disk: afl keeps its
+    queue, the score DBs keep the scores
+    '''
+    global OUTPUT, START_TIME, SCHEDULER, SCALE_NUM, FUZZER_USAGE, SCORE_SERVICE, LOG
+    start_time = time.time()
+    checkpoint.save(OUTPUT, {
+        'elapsed': time.time() - START_TIME,
+        'scale_num': SCALE_NUM,
+        'usage': FUZZER_USAGE,
+        'scheduler': SCHEDULER.state() if SCHEDULER else None,
+        'sync': sync.state(),
+        'seedstore': seedstore.STORE.state(),
+        'board': SCORE_SERVICE.board.as_dict(),
+        'log': LOG,
+    })
+    runlog.event('checkpoint', seconds=time.time() - start_time)
+
+def restore_checkpoint(state):
+    '''
+    the part of the checkpoint needed before the fuzzers start
+    '''
+    global START_TIME, SCALE_NUM, FUZZER_USAGE, LOG
+    # NOTE: the downtime does not count against the timeout
+    START_TIME = time.time() - state['elapsed']
+    runlog.RUNLOG.start_time = START_TIME
+    SCALE_NUM.update(state['scale_num'])
+    for fuzzer, usage in state['usage'].items():
+        FUZZER_USAGE[fuzzer].update(usage)
+    for key, value in state['log'].items():
+        if key not in ('dcfuzz_args', 'dcfuzz_config', 'start_time', 'algorithm'):
+            LOG[key] = value
+    LOG['resume'] = state['log'].get('resume', []) + [time.time()]
+    sync.load_state(state['sync'])
+    seedstore.STORE.load_state(state['seedstore'])
+    logger.info(f'main 012 - resume after {state["elapsed"]:.0f}s, scale : {SCALE_NUM}')
+
+def json_dumper(obj):
+    '''
+    Path / set / numpy values in LOG
+    '''
+    if isinstance(obj, set):
+        return list(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
 def write_log():
     global LOG, RUNNING
     if not RUNNING:
@@ -291,10 +557,16 @@ def write_log():
     else:
         assert False, 'update_log error'
 
+def interrupt(signum, frame):
+    global INTERRUPTED
+    logger.info(f'main 670 - {signal.Signals(signum).name}, exit')
+    INTERRUPTED = True
+    sys.exit(0)
+
 def init():
     global START_TIME, LOG
-    signal.signal(signal.SIGTERM, lambda x, frame: sys.exit(0))
-    signal.signal(signal.SIGINT, lambda x, frame: sys.exit(0))
+    signal.signal(signal.SIGTERM, interrupt)
+    signal.signal(signal.SIGINT, interrupt)
     atexit.register(cleanup)
     sys.excepthook = cleanup_exception
     health_check_path = os.path.realpath(os.path.join(ARGS.output, 'health'))
@@ -308,33 +580,33 @@ def init_cgroup():
 
     '''
     cgroup /dcfuzz is created by /init.sh, the command is the following:
-    cgcreate -t yufu -a yufu -g cpu:/dcfuzz
+    cgcreate -t yufu -a yufu -g cpu:/dcfuzz (v1)
+    mkdir /sys/fs/cgroup/dcfuzz (v2)
     '''
 
-    global FUZZERS, CGROUP_ROOT
+    global FUZZERS, CGROUP_ROOT, ARGS, CGROUP_MANAGER, SCORE_CGROUP
     # start with /
     cgroup_path = cgroup_utils.get_cgroup_path()
-    container_id = os.path.basename(cgroup_path)
-    cgroup_path_fs = os.path.join('/sys/fs/cgroup/cpu', cgroup_path[1:])
-    dcfuzz_cgroup_path_fs = os.path.join(cgroup_path_fs, 'dcfuzz')
+    CGROUP_ROOT = os.path.join(cgroup_path, 'dcfuzz')
+    backend = cgroup_utils.init_backend(CGROUP_ROOT, ARGS.cgroup)
+    if ARGS.pause_mode == 'freeze':
+        backend.use_freezer()
 
-    if not os.path.exists(dcfuzz_cgroup_path_fs):
+    if not backend.exists():
         logger.critical(
             'dcfuzz cgroup not exists. make sure to run /init.sh first')
         terminate_dcfuzz()
 
-    t = trees.Tree()
-    p = os.path.join('/cpu', cgroup_path[1:], 'dcfuzz')
-    CGROUP_ROOT = os.path.join(cgroup_path, 'dcfuzz')
-    cpu_node = t.get_node_by_path(p)
-    
-    for fuzzer in FUZZERS:
-        fuzzer_cpu_node = t.get_node_by_path(os.path.join(p, fuzzer))
-        if not fuzzer_cpu_node:
-            fuzzer_cpu_node = cpu_node.create_cgroup(fuzzer)
-        cfs_period_us = fuzzer_cpu_node.controller.cfs_period_us
-        quota = int(cfs_period_us * (1))
-        fuzzer_cpu_node.controller.cfs_quota_us = quota
+    CGROUP_MANAGER = cgroup_utils.CgroupManager(backend, FUZZERS)
+    CGROUP_MANAGER.init()
+    if ARGS.pause_mode == 'freeze':
+        # NOTE: a killed run may have left a group frozen
+        for fuzzer in FUZZERS:
+            backend.freeze(fuzzer, False)
+    SCORE_CGROUP = CGROUP_MANAGER.add_group(evaluator.SCORE_GROUP, config['score_DAFL']['cpu'])
+    if ARGS.cpuset:
+        for fuzzer in FUZZERS + [evaluator.SCORE_GROUP]:
+            backend.set_cpuset(fuzzer, ARGS.cpuset)
 
     logger.info(f'main 201 - cgroup init end')
     return True
@@ -343,26 +615,41 @@ def init_cgroup():
 # input : output directory
 # output : score directory
 def init_evaluate(output_dir):
-    global EVALUTOR_DIR, TARGET
+    global EVALUTOR_DIR, TARGET, SCORE_SERVICE, EVALUATOR, FUZZERS, SCORE_CGROUP
     logger.info(f'main 202 - evaluate init start {output_dir}')
     fuzzer_config = config['score_DAFL']
     host_output_dir = f'{output_dir}/{TARGET}/score'
-    if os.path.exists(f'{output_dir}/{TARGET}/score'):
+    if os.path.exists(f'{output_dir}/{TARGET}/score') and not ARGS.resume:
         logger.error(f'Please remove {output_dir}/{TARGET}/score')
         terminate_dcfuzz()
     os.makedirs(host_output_dir, exist_ok=True)
     EVALUTOR_DIR = host_output_dir
+    SCORE_SERVICE = evaluator.ScoreService(program=TARGET, output_dir=EVALUTOR_DIR, start_time=START_TIME,
+                                           cgroup_path=SCORE_CGROUP)
+    SCORE_SERVICE.start()
+    EVALUATOR = evaluator.EvaluationPipeline(service=SCORE_SERVICE, fuzzers=FUZZERS, interval=fuzzer_config['interval'])
+    EVALUATOR.start()
     logger.info(f'main 202 - evaluate init end')
 
 
 def evaluate_score(fuzzer : str):  #, executionTime):
-    global EVALUTOR_DIR, OUTPUT, TARGET
-    results = {}
-    fuzzer_dir = f'{OUTPUT}/{TARGET}/{fuzzer}/queue'
-    max_score = evaluator.extract_score(fuzzer=fuzzer, seed=fuzzer_dir, output_dir=EVALUTOR_DIR, program=TARGET)
+    '''
+    seeds are scored in the background, only read the running best score
+    '''
+    global SCORE_SERVICE
+    max_score = SCORE_SERVICE.board.best(fuzzer).score
     logger.info(f'main 9999 - {fuzzer} results : {max_score}')
     return max_score
 
+def drain_evaluate(timeout=None):
+    global EVALUATOR
+    before_time = time.time()
+    if timeout is None:
+        timeout = config['score_DAFL']['drain_timeout']
+    EVALUATOR.drain(timeout)
+    logger.info(f'main 9998 - drain evaluate take {time.time() - before_time} seconds')
+    runlog.event('drain', seconds=time.time() - before_time)
+
 
 
 class SchedulingAlgorithm(metaclass=SingletonABCMeta):
@@ -407,13 +694,24 @@ class Schedule_Base(SchedulingAlgorithm):
         self.picked_times: Dict[Fuzzer, int]
         self.diff_threshold = None
 
+    def state(self) -> Dict:
+        return {'round': self.round}
+
+    def load_state(self, saved: Dict):
+        self.round = saved['round']
+
     def run_one(self, run_fuzzer):
         assert run_fuzzer in self.fuzzers
-        for fuzzer in self.fuzzers:
-            new_cpu = 1 if fuzzer == run_fuzzer else 0
-            update_fuzzer_limit(fuzzer, new_cpu)
+        update_fuzzer_limits({fuzzer: 1 if fuzzer == run_fuzzer else 0 for fuzzer in self.fuzzers})
         logger.debug(f'single one: {run_fuzzer}')
 
+    def run_many(self, cpu_assign: Dict[str, float]):
+        '''
+        run several fuzzers at once, cpu_assign is in cores (fraction allowed)
+        '''
+        update_fuzzer_limits({fuzzer: cpu_assign.get(fuzzer, 0) for fuzzer in self.fuzzers})
+        logger.debug(f'run many: {cpu_assign}')
+
     def pre_round(self):
         pass
 
@@ -449,7 +747,7 @@ class Schedule_Single(Schedule_Base):
     def one_round(self):
         logger.info(f'main 701 - one_round start')
         self.run_one(self.single)
-        sleep(60)
+        sleep(60, until=slot_end_on([self.single]))
         # score = evaluate_score(self.single)
         # logger.info(f'main 702 - single round {self.round} end - {self.single} perform  : {score}')
         
@@ -479,10 +777,26 @@ class Schedule_Single(Schedule_Base):
 
 # multi fuzzer 실행하기
 class Schedule_DCFuzz(Schedule_Base):
-    def __init__(self, fuzzers, dcFuzzers, prep_time=600, focus_time=600):
-        super().__init__(fuzzers=fuzzers, dcFuzzers=dcFuzzers, prep_time=prep_time, focus_time=focus_time)
+    def __init__(self, fuzzers, dcFuzzers, prep_time=600, focus_time=600, jobs=1, top_k=None, max_instances=1, bandit_name='thompson', adaptive=False, skip_dominated=False):
+        super().__init__(fuzzers=fuzzers, dcFuzzers=dcFuzzers, prep_time=prep_time, focus_time=focus_time, jobs=jobs)
         self.name = f'RCFuzzer_{prep_time}_{focus_time}' 
         self.round = 1      
+        # NOTE: the bandit keeps its state across rounds, dcFuzzers only hold
+        # what every fuzzer did in the last prep phase
+        # NOTE: more than one core per fuzzer is only usable through -S instances
+        self.policy = policy.BanditPolicy(bandit.make_bandit(bandit_name, fuzzers),
+                                          top_k=top_k if jobs > 1 else 1,
+                                          max_cpu_per_fuzzer=max_instances if jobs > 1 else 1)
+        # NOTE: adaptive slices grow while the score improves, shrink on a plateau
+        self.adaptive = adaptive
+        self.prep_slices = slicing.prep_slices(min(prep_time, 150))
+        self.focus_slices = slicing.focus_slices(focus_time)
+        self.stability = slicing.RankStability(config['adaptive']['stable_rounds'])
+        # NOTE: relies on the bandit state carried across rounds
+        self.skip_dominated = skip_dominated
+        self.prepped = set(fuzzers)
+        self.skipped = {f: 0 for f in fuzzers}
+        self.probe_gap = {f: config['converge']['probe_every'] for f in fuzzers}
 
         #self.find_new_round = False
         #self.policy_bitmap = policy.BitmapPolicy()
@@ -492,10 +806,73 @@ class Schedule_DCFuzz(Schedule_Base):
         #self.picked_times = {}
             
     
+    def state(self) -> Dict:
+        bandit = self.policy.bandit
+        return {
+            **super().state(),
+            'bandit': {'name': bandit.name, 'rounds': bandit.rounds, 'state': bandit.as_dict()},
+            'skipped': self.skipped,
+            'probe_gap': self.probe_gap,
+            'prep_slices': self.prep_slices.slices,
+            'focus_slices': self.focus_slices.slices,
+        }
+
+    def load_state(self, saved: Dict):
+        super().load_state(saved)
+        bandit = self.policy.bandit
+        if saved['bandit']['name'] == bandit.name:
+            bandit.rounds = saved['bandit']['rounds']
+            bandit.load(saved['bandit']['state'])
+        else:
+            logger.info(f"main 013 - bandit changed {saved['bandit']['name']} -> {bandit.name}, start from the prior")
+        self.skipped.update(saved['skipped'])
+        self.probe_gap.update(saved['probe_gap'])
+        self.prep_slices.slices.update(saved['prep_slices'])
+        self.focus_slices.slices.update(saved['focus_slices'])
+
+    def record_prep(self, prep_fuzzers, start_score, start_usage):
+        '''
+        score, score gain and usage of every fuzzer since the prep phase started
+        '''
+        global SCORE_SERVICE, FUZZER_USAGE
+        for fuzzer in prep_fuzzers:
+            dc = self.dcFuzzers[fuzzer]
+            dc.score = SCORE_SERVICE.board.best(fuzzer).score
+            dc.gain = dc.score - start_score[fuzzer]
+            dc.cpu = FUZZER_USAGE[fuzzer]['cpu'] - start_usage[fuzzer]['cpu']
+            dc.execs = FUZZER_USAGE[fuzzer]['execs'] - start_usage[fuzzer]['execs']
+
+    def plan_prep(self, prep_fuzzers):
+        '''
+        fuzzer -> share of the prep slice it runs this round, fuzzers left
+        out skip prep. a fuzzer is dominated when the bandit gives it less
+        than `dominated` chance of being the best; it is probed every
+        probe_gap rounds and the gap doubles while it stays dominated
+        '''
+        if not self.skip_dominated:
+            return {f: 1 for f in prep_fuzzers}
+        params = config['converge']
+        p_best = self.policy.bandit.prob_best(params['samples'])
+        plan = {}
+        for fuzzer in prep_fuzzers:
+            if p_best[fuzzer] >= params['dominated']:
+                plan[fuzzer] = 1
+                self.probe_gap[fuzzer] = params['probe_every']
+                self.skipped[fuzzer] = 0
+            elif self.skipped[fuzzer] + 1 >= self.probe_gap[fuzzer]:
+                plan[fuzzer] = params['probe_factor']
+                self.skipped[fuzzer] = 0
+                self.probe_gap[fuzzer] = min(self.probe_gap[fuzzer] * 2, params['max_probe_gap'])
+            else:
+                self.skipped[fuzzer] += 1
+        logger.info(f'main 501 - round {self.round} p_best : {p_best}, prep plan : {plan}')
+        self.prepped = set(plan)
+        return plan
+
     def prep(self):
         round_start_time = time.time()
 
-        global OUTPUT, TARGET, START_TIME
+        global OUTPUT, TARGET, START_TIME, SCORE_SERVICE, ARGS
         logger.info(f'main 500 - start preparation phase')
         PRIORITY = ['dafl', 'windranger', 'aflgo']
         
@@ -510,6 +887,16 @@ class Schedule_DCFuzz(Schedule_Base):
         prep_round = 1
         perform = defaultdict(list)
         prep_start_time = time.time()
+        # score and usage at the start, the efficiency rewards count the prep phase only
+        start_score = {f: SCORE_SERVICE.board.best(f).score for f in self.fuzzers}
+        start_usage = {f: dict(FUZZER_USAGE[f]) for f in self.fuzzers}
+        # adaptive: every fuzzer spends up to prep_time in slices of its own length
+        spent = {f: 0.0 for f in prep_fuzzers}
+        self.stability.reset()
+        # dominated fuzzers only get a rare, short probe slice
+        slice_factor = self.plan_prep(prep_fuzzers)
+        prep_fuzzers = [f for f in prep_fuzzers if f in slice_factor]
+        runlog.event('prep_start', round=self.round, plan=slice_factor)
 
         #do_sync(self.fuzzers, OUTPUT)        
         
@@ -517,50 +904,106 @@ class Schedule_DCFuzz(Schedule_Base):
             run_time = min(remain_time,150)
 
             for prep_fuzzer in prep_fuzzers:
-                logger.info(f'main 502 - prep_fuzzer : {prep_fuzzer}, run time : {run_time}')
+                if is_end(): return
+                if prep_fuzzer in EXITED_FUZZERS: continue
+                if self.adaptive:
+                    left = prep_time * slice_factor[prep_fuzzer] - spent[prep_fuzzer]
+                    if left < 1: continue
+                    slot_time = min(self.prep_slices.length(prep_fuzzer), left)
+                    spent[prep_fuzzer] += slot_time
+                else:
+                    slot_time = run_time * slice_factor[prep_fuzzer]
+                before_score = evaluate_score(prep_fuzzer)
+                logger.info(f'main 502 - prep_fuzzer : {prep_fuzzer}, run time : {slot_time}')
                 self.run_one(prep_fuzzer)
-                sleep(run_time)
+                run_slot(slot_time, [prep_fuzzer])
                 before_time = time.time()
+                if self.adaptive:
+                    # NOTE: the slice feedback and the stable ranking need the
+                    # slot's seeds scored, not whatever the background pass got to
+                    drain_evaluate(config['score_DAFL']['slot_drain_timeout'])
                 score = evaluate_score(prep_fuzzer)
                 perform[prep_fuzzer].append({
                     'prep_round': prep_round,
                     'score': score
                 })
+                if self.adaptive:
+                    self.prep_slices.feedback(prep_fuzzer, score > before_score)
                 after_time = time.time()
                 evaluate_run_time = after_time - before_time
                 logger.info(f'main 503 - prep round {prep_round} end - {prep_fuzzer} perform  : {perform[prep_fuzzer]}, evaluate_run_time: {evaluate_run_time}')
+                runlog.event('prep_slot', round=self.round, prep_round=prep_round, fuzzer=prep_fuzzer,
+                             slot_time=slot_time, before=before_score, score=score)
             
-            remain_time -= run_time
+            if self.adaptive:
+                lefts = [prep_time * slice_factor[f] - spent[f] for f in prep_fuzzers if f not in EXITED_FUZZERS]
+                remain_time = max([l for l in lefts if l >= 1], default=0)
+            else:
+                remain_time -= run_time
             prep_round +=1
             do_sync(self.fuzzers, OUTPUT)
+
+            if self.adaptive and remain_time > 0:
+                self.record_prep(prep_fuzzers, start_score, start_usage)
+                values = thompson.rank_values(self.dcFuzzers, mode=ARGS.reward)
+                if self.stability.observe(thompson.rank_groups(values)):
+                    logger.info(f'main 506.5 - prep round {self.round} ends early after {prep_round - 1} rounds, stable ranking : {self.stability.last}')
+                    break
         
+        # NOTE: the last fuzzer is still running while late seeds get scored
+        drain_evaluate()
+
         prep_end_time = time.time()
         prep_run_time = prep_end_time - prep_start_time
 
+        self.record_prep(prep_fuzzers, start_score, start_usage)
         for fuzzer in prep_fuzzers:
-            self.dcFuzzers[fuzzer].score = max(entry['score'] for entry in perform[fuzzer])
-            logger.info(f'main 504 - round {self.round} prep phase end - {fuzzer} max score  : {self.dcFuzzers[fuzzer].score}')
+            best = SCORE_SERVICE.board.best(fuzzer)
+            dc = self.dcFuzzers[fuzzer]
+            logger.info(f'main 504 - round {self.round} prep phase end - {fuzzer} max score  : {best.score}, seed : {best.seed}, time_to_best : {best.time_to_best}')
+            logger.info(f'main 504.5 - round {self.round} prep phase end - {fuzzer} score gain : {dc.gain}, cpu : {dc.cpu:.1f}s, execs : {dc.execs:.0f}')
+        LOG['best'] = SCORE_SERVICE.board.as_dict()
+        runlog.event('prep_end', round=self.round, seconds=prep_run_time, prep_rounds=prep_round - 1,
+                     results={f: {'score': self.dcFuzzers[f].score, 'gain': self.dcFuzzers[f].gain,
+                                  'cpu': self.dcFuzzers[f].cpu, 'execs': self.dcFuzzers[f].execs}
+                              for f in prep_fuzzers})
 
         logger.info(f'main 505 - prep round {self.round} end - prep_start_time: {prep_start_time}, prep_end_time:{prep_end_time}, prep_run_time : {prep_run_time}')
                 
                 
     def focus(self):
         logger.info(f'main 506- start focus phase')
-        global OUTPUT
+        global OUTPUT, SCORE_SERVICE, ARGS
         focus_start_time = time.time()
 
-        focus_time = self.focus_time
+        focus_time = self.focus_slices.length('focus') if self.adaptive else self.focus_time
         
-        thompson.rankFuzzer(self.dcFuzzers)
+        # NOTE: fuzzers that skipped prep are not observed this round
+        prepped = {f: self.dcFuzzers[f] for f in self.fuzzers if f in self.prepped}
+        if len(prepped) > 1:
+            rewards = thompson.rank_rewards(prepped, board=SCORE_SERVICE.board, mode=ARGS.reward)
+            self.policy.update(rewards)
+        else:
+            # NOTE: a lone arm ranks first against itself, nothing was compared
+            rewards = {}
+            logger.info(f'main 506.6 - round {self.round} only {list(prepped)} prepped, keep the {self.policy.bandit.name} state')
+        LOG['bandit'] = self.policy.bandit.as_dict()
+        logger.info(f'main 507 - {self.round} round rewards : {rewards}, {self.policy.bandit.name} state : {LOG["bandit"]}')
         
-        for fuzzer in self.fuzzers:
-            logger.info(f'main 507 - {self.round} round {fuzzer} rank -  success :{self.dcFuzzers[fuzzer].S}, failure :{self.dcFuzzers[fuzzer].F}')
+        # split the cores across the top-k fuzzers of one draw, top 1 on a single core
+        picked_fuzzers, cpu_assign = self.policy.calculate_cpu(self.fuzzers, max_cores=self.jobs)
+        selected_fuzzers = [f for f in picked_fuzzers if cpu_assign[f] > 0]
         
-        selected_fuzzer = thompson.selectFuzzer(self.dcFuzzers)
-        
-        logger.info(f'main 508 -  selected_fuzzer : {selected_fuzzer}')
-        self.run_one(selected_fuzzer)
-        sleep(focus_time)
+        logger.info(f'main 508 -  selected_fuzzers : {selected_fuzzers}, cpu_assign : {cpu_assign}')
+        runlog.event('focus_start', round=self.round, rewards=rewards, selected=selected_fuzzers,
+                     cpu_assign=cpu_assign, focus_time=focus_time)
+        self.run_many(cpu_assign)
+        # after resume, a paused primary would start its secondaries paused
+        for fuzzer in selected_fuzzers:
+            scale_up(fuzzer, math.ceil(cpu_assign[fuzzer] - 1e-6))
+        before_score = {f: evaluate_score(f) for f in selected_fuzzers}
+        logger.info(f'main 508.5 - focus run time : {focus_time}')
+        run_slot(focus_time, selected_fuzzers)
         # while focus_time > 0: 
         #     run_time = focus_time
         #     run_time = min(focus_time,150)
@@ -569,22 +1012,26 @@ class Schedule_DCFuzz(Schedule_Base):
         #     focus_time -= run_time
 
         evaluate_start_time = time.time()
-        score = evaluate_score(selected_fuzzer)
+        for selected_fuzzer in selected_fuzzers:
+            score = evaluate_score(selected_fuzzer)
+            logger.info(f'main 509 - round {self.round} focus phase end - {selected_fuzzer} max score  : {score}')
         evaluate_end_time = time.time()
 
         evaluate_run_time = evaluate_end_time - evaluate_start_time
-        logger.info(f'main 509 - round {self.round} focus phase end - {selected_fuzzer} max score  : {score}')
         logger.info(f'main 666 - round {self.round} focus phase evaluate - evaluate_run_time : {evaluate_run_time}')
 
+        if self.adaptive:
+            improved = any(evaluate_score(f) > before_score[f] for f in selected_fuzzers)
+            self.focus_slices.feedback('focus', improved)
+
         do_sync(self.fuzzers, OUTPUT)
         
         focus_end_time = time.time()
         focus_run_time = focus_end_time - focus_start_time
-        
-        for fuzzer in self.fuzzers:
-            self.dcFuzzers[fuzzer] = thompson.fuzzer()
 
         logger.info(f'main 510 - focus round {self.round} end - focus_start_time: {focus_start_time}, focus_end_time:{focus_end_time}, focus_run_time : {focus_run_time}')
+        runlog.event('focus_end', round=self.round, seconds=focus_run_time, evaluate_seconds=evaluate_run_time,
+                     scores={f: SCORE_SERVICE.board.best(f).score for f in selected_fuzzers})
         
     def main(self):
         # if is_end():return
@@ -595,10 +1042,15 @@ class Schedule_DCFuzz(Schedule_Base):
             if is_end():return
             #if not self.pre_round():continue
             logger.info(f'main 801 - dcfuzz phase round {self.round} start')
+            runlog.event('round_start', round=self.round)
             self.prep()
+            if is_end():return
             self.focus()
             logger.info(f'main 803 - dcfuzz phase round {self.round} end')
+            runlog.event('round_end', round=self.round, best={f: SCORE_SERVICE.board.best(f).score for f in self.fuzzers})
+            log_memory()
             self.round+=1
+            save_checkpoint()
             #self.post_round()
         
     def pre_run(self) -> bool:
@@ -617,7 +1069,7 @@ class Schedule_DCFuzz(Schedule_Base):
 def main():
     global ARGS, TARGET, FUZZERS, OUTPUT, INPUT, TIMEOUT, PREP_TIME, FOCUS_TIME
     global START_TIME, LOG_DATETIME, LOG_FILE_NAME
-    global CPU_ASSIGN
+    global CPU_ASSIGN, SLOT_METER, COLLECTOR, RUNNING, SCHEDULER
 
     ARGS = cli.ArgsParser().parse_args()
 
@@ -636,18 +1088,36 @@ def main():
     else:
         INPUT = None
 
-    logger.info(f'main 002 - check ARG : target : {TARGET}, fuzzer : {FUZZERS}, output : {OUTPUT}, timeout : {TIMEOUT}, prep_time : {PREP_TIME}, focus_time :{FOCUS_TIME}')
+    logger.info(f'main 002 - check ARG : target : {TARGET}, fuzzer : {FUZZERS}, output : {OUTPUT}, timeout : {TIMEOUT}, prep_time : {PREP_TIME}, focus_time :{FOCUS_TIME}, cores : {ARGS.cores}, reward : {ARGS.reward}, bandit : {ARGS.bandit}, slicing : {ARGS.slicing}, sync : {ARGS.sync_mode}')
 
-    # create output directory
-    try:
-        os.makedirs(OUTPUT, exist_ok=False)
-    except FileExistsError:
-        logger.error(f'remove {OUTPUT}')
+    # NOTE: only the v2 backend pins cpus, fail before anything is started
+    if ARGS.cpuset and cgroup_utils.resolve_version(ARGS.cgroup) != 'v2':
+        logger.error('--cpuset needs the cgroup v2 backend')
         exit(1)
+
+    # create output directory
+    resume_state = None
+    if ARGS.resume:
+        resume_state = checkpoint.load(OUTPUT)
+        if resume_state is None:
+            logger.error(f'no checkpoint in {OUTPUT} to resume')
+            exit(1)
+    else:
+        try:
+            os.makedirs(OUTPUT, exist_ok=False)
+        except FileExistsError:
+            logger.error(f'remove {OUTPUT}')
+            exit(1)
+    # NOTE: the driver DB (fuzzer pids) must outlive dcfuzz for --resume
+    Config.DATABASE_DIR = str(OUTPUT / 'driver')
+    os.makedirs(Config.DATABASE_DIR, exist_ok=True)
     
     START_TIME = time.time()
     current_time = time.time()
     init()
+    # NOTE: appended to on --resume
+    runlog.init_runlog(OUTPUT, START_TIME)
+    runlog.event('run_start', resume=bool(ARGS.resume), args=ARGS.as_dict())
     LOG['dcfuzz_args'] = ARGS.as_dict()  # remove Namespace
     LOG['dcfuzz_config'] = config
     LOG['start_time'] = current_time
@@ -655,6 +1125,14 @@ def main():
 
     # setup cgroup
     init_cgroup()
+    SLOT_METER = pausebench.SlotMeter(CGROUP_MANAGER, OUTPUT / TARGET, OUTPUT, ARGS.pause_mode)
+    COLLECTOR = collector.StatsCollector(interval=config['collector']['interval'],
+                                         capacity=config['collector']['capacity'])
+
+    # one copy of every unique seed, shared by sync and evaluator
+    seedstore.init_store(OUTPUT / TARGET / 'store')
+    if resume_state:
+        restore_checkpoint(resume_state)
     
     dcFuzzers = {}
 
@@ -678,20 +1156,31 @@ def main():
                 logger.critical('fuzzers start up error')
                 terminate_dcfuzz()
 
+        # NOTE: watch the queue from the start so seeds are scored in the background
+        watcher.init_watcher(fuzzer, OUTPUT / TARGET / fuzzer)
+        COLLECTOR.add(fuzzer, OUTPUT / TARGET / fuzzer)
+        for w in watcher.WATCHERS[fuzzer]:
+            watch_crash(fuzzer, w)
+        # secondaries relaunched by the driver on resume
+        watch_instances(fuzzer, 1, SCALE_NUM.get(fuzzer, 1))
+
         logger.info(f'main 005 - pause before')
         pause(fuzzer=fuzzer, jobs=1, input_dir=INPUT)
         logger.info(f'main 005.5 - pause after')
     
     # setup evaluate
     init_evaluate(output_dir=OUTPUT)
+    if resume_state:
+        SCORE_SERVICE.board.restore(resume_state['board'])
+
+    init_events()
         
 
     LOG_DATETIME = f'{datetime.datetime.now():%Y-%m-%d-%H-%M-%S}'
     LOG_FILE_NAME = f'{TARGET}_{LOG_DATETIME}.json'
 
-    # thread_fuzzer_log = threading.Thread(target=thread_update_fuzzer_log, kwargs={'fuzzers': FUZZERS}, daemon=True)
-        
-    # thread_fuzzer_log.start()
+    # NOTE: replaces thread_update_fuzzer_log, tails fuzzer_stats / plot_data by offset
+    COLLECTOR.start()
         
     # thread_health = threading.Thread(target=thread_health_check, daemon=True)
     # thread_health.start()
@@ -707,12 +1196,16 @@ def main():
         algorithm = FUZZERS[0]
     else: 
         logger.info(f'main 006 - multi_fuzzer : {FUZZERS}, PREP_TIME : {PREP_TIME}, FOCUS_TIME :{FOCUS_TIME} ')
-        scheduler = Schedule_DCFuzz(fuzzers=FUZZERS, dcFuzzers=dcFuzzers, prep_time=PREP_TIME, focus_time=FOCUS_TIME)
+        scheduler = Schedule_DCFuzz(fuzzers=FUZZERS, dcFuzzers=dcFuzzers, prep_time=PREP_TIME, focus_time=FOCUS_TIME, jobs=ARGS.cores, top_k=ARGS.top_k, max_instances=ARGS.max_instances, bandit_name=ARGS.bandit, adaptive=ARGS.slicing == 'adaptive', skip_dominated=ARGS.skip_dominated)
         algorithm = 'dcfuzz'
     
     LOG['algorithm'] = algorithm
+    SCHEDULER = scheduler
+    if resume_state and resume_state['scheduler']:
+        scheduler.load_state(resume_state['scheduler'])
 
     RUNNING = True
+    EVENTS.add_timer(config['checkpoint']['interval'], save_checkpoint)
 
     # # Timer to stop all fuzzers
     logger.info(f'main 007 - algorithm : {algorithm}, scheduler: {scheduler}')
@@ -720,6 +1213,11 @@ def main():
     scheduler.run()
 
     logger.info(f'main 008 - scheduler run end')
+    logger.info(f'main 009 - cgroup quota writes : {CGROUP_MANAGER.writes}, skipped : {CGROUP_MANAGER.skipped}')
+    logger.info(f'main 009.5 - scorer cpu : {CGROUP_MANAGER.backend.cpu_usage(evaluator.SCORE_GROUP)}')
+
+    EVALUATOR.stop()
+    SCORE_SERVICE.stop()
 
     LOG['end_time'] = time.time()
 
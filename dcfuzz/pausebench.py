@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+'''
+measure what a paused fuzzer costs the running one.
+
+the scheduler records one line per time slot in {output}/pause_bench.jsonl:
+cpu seconds used by the running and by the paused fuzzers (cgroup
+accounting) and the execs/sec of the running fuzzers (afl plot_data).
+
+compare two runs, e.g. --pause-mode signal and --pause-mode freeze:
+    python -m dcfuzz.pausebench out_signal out_freeze
+'''
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('dcfuzz.pausebench')
+
+BENCH_FILE = 'pause_bench.jsonl'
+
+
+def read_execs_per_sec(fuzzer_output: str) -> Optional[float]:
+    '''
+    last execs_per_sec of afl plot_data (written every few seconds)
+    '''
+    plot_data = os.path.join(fuzzer_output, 'plot_data')
+    try:
+        with open(plot_data, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 512))
+            last = f.read().splitlines()[-1].decode()
+    except (OSError, IndexError):
+        return None
+    if last.startswith('#'):
+        return None
+    try:
+        return float(last.split(',')[-1])
+    except ValueError:
+        return None
+
+
+class SlotMeter(object):
+    def __init__(self, manager, fuzzer_root: str, output_dir: str, mode: str):
+        '''
+        manager: cgroup_utils.CgroupManager
+        fuzzer_root: {output}/{target}, holding one afl output dir per fuzzer
+        '''
+        self.manager = manager
+        self.fuzzer_root = fuzzer_root
+        self.mode = mode
+        self.path = os.path.join(output_dir, BENCH_FILE)
+        self._start_time = 0.0
+        self._start_usage: Dict[str, Optional[float]] = {}
+
+    def begin(self) -> None:
+        self._start_time = time.time()
+        self._start_usage = self.manager.cpu_usage()
+
+    def end(self, run_fuzzers: List[str]) -> Dict[str, float]:
+        '''
+        return the cpu seconds every fuzzer used during the slot
+        '''
+        slot = time.time() - self._start_time
+        usage = self.manager.cpu_usage()
+        delta = {f: usage[f] - self._start_usage[f] for f in usage
+                 if usage[f] is not None and self._start_usage.get(f) is not None}
+        if not delta:
+            return delta
+        row = {
+            'time': time.time(),
+            'mode': self.mode,
+            'slot': slot,
+            'running': run_fuzzers,
+            'run_cpu': sum(v for f, v in delta.items() if f in run_fuzzers),
+            'paused_cpu': sum(v for f, v in delta.items() if f not in run_fuzzers),
+            'execs_per_sec': {f: read_execs_per_sec(os.path.join(self.fuzzer_root, f)) for f in run_fuzzers},
+        }
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(row) + '\n')
+        logger.info(f"pausebench 001 - {self.mode} slot {slot:.1f}s run_cpu {row['run_cpu']:.2f}s paused_cpu {row['paused_cpu']:.2f}s")
+        return delta
+
+
+def summarize(output_dir: str) -> Dict:
+    rows = []
+    with open(os.path.join(output_dir, BENCH_FILE)) as f:
+        for line in f:
+            rows.append(json.loads(line))
+    slot = sum(r['slot'] for r in rows)
+    execs = [v for r in rows for v in r['execs_per_sec'].values() if v is not None]
+    return {
+        'mode': rows[0]['mode'] if rows else '?',
+        'slots': len(rows),
+        'run_cpu_share': sum(r['run_cpu'] for r in rows) / slot if slot else 0,
+        'paused_cpu_share': sum(r['paused_cpu'] for r in rows) / slot if slot else 0,
+        'execs_per_sec': sum(execs) / len(execs) if execs else 0,
+    }
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description='compare pause modes of dcfuzz runs')
+    p.add_argument('outputs', nargs='+', help='dcfuzz output directories')
+    args = p.parse_args(argv)
+
+    summaries = [summarize(o) for o in args.outputs]
+    base = summaries[0]
+    print(f"{'output':<30} {'mode':<8} {'slots':>6} {'run cpu':>8} {'paused cpu':>11} {'execs/s':>10} {'vs base':>8}")
+    for output, s in zip(args.outputs, summaries):
+        gain = (s['execs_per_sec'] / base['execs_per_sec'] - 1) * 100 if base['execs_per_sec'] else 0
+        print(f"{output:<30} {s['mode']:<8} {s['slots']:>6} {s['run_cpu_share']:>8.3f} "
+              f"{s['paused_cpu_share']:>11.4f} {s['execs_per_sec']:>10.1f} {gain:>+7.1f}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,8 +13,7 @@ config = Config.CONFIG
 logger = logging.getLogger('rcfuzz.policy')
 
 
-class Policy(object):
-    __metaclass__ = ABCMeta
+class Policy(metaclass=ABCMeta):
 
     @abstractmethod
     def __init__(self):
@@ -158,4 +157,59 @@ class BitmapPolicy(Policy):
         if not self._check(fuzzers, fuzzer_info):
             return None
         rank, rank_num, ordered_fuzzers = self._rank(fuzzers, fuzzer_info)
-        return ordered_fuzzers
\ No newline at end of file
+        return ordered_fuzzers
+
+
+class BanditPolicy(Policy):
+    '''
+    split max_cores across the top-k fuzzers of one bandit draw,
+    proportional to their drawn weight
+    '''
+    def __init__(self, bandit, top_k=None, max_cpu_per_fuzzer=1):
+        '''
+        bandit: bandit.Bandit, one arm per fuzzer, kept across rounds
+        '''
+        self.bandit = bandit
+        self.top_k = top_k
+        # NOTE: one afl-fuzz process can not use more than one core
+        self.max_cpu_per_fuzzer = max_cpu_per_fuzzer
+
+    def schedule(self):
+        pass
+
+    def _split(self, weights, max_cores, cap):
+        '''
+        proportional split with a per-fuzzer cap, the excess is handed to the
+        fuzzers still under the cap
+        '''
+        cpu_assign = {f: 0.0 for f in weights}
+        remain = max_cores
+        open_fuzzers = [f for f in weights]
+        while remain > 1e-9 and open_fuzzers:
+            total = sum(weights[f] for f in open_fuzzers)
+            share = {f: (weights[f] / total if total > 0 else 1 / len(open_fuzzers)) * remain
+                     for f in open_fuzzers}
+            remain = 0
+            for f in list(open_fuzzers):
+                room = cap - cpu_assign[f]
+                if share[f] >= room:
+                    cpu_assign[f] = cap
+                    remain += share[f] - room
+                    open_fuzzers.remove(f)
+                else:
+                    cpu_assign[f] += share[f]
+        return cpu_assign
+
+    def update(self, rewards):
+        self.bandit.update(rewards)
+
+    def calculate_cpu(self, fuzzers, fuzzer_info=None, max_cores=1):
+        '''
+        fuzzers: fuzzer names, the arms of the bandit
+        '''
+        top_k = self.top_k or max_cores
+        picked_fuzzers, weights = self.bandit.select(int(top_k))
+        picked_assign = self._split(weights, max_cores, self.max_cpu_per_fuzzer)
+        cpu_assign = {f: picked_assign.get(f, 0) for f in fuzzers}
+        logger.info(f'policy - {self.bandit.name} picked : {picked_fuzzers}, cpu_assign : {cpu_assign}')
+        return picked_fuzzers, cpu_assign
@@ -0,0 +1,163 @@
+'''
+append-only run log, one json object per line in {output}/runlog.jsonl.
+
+events are buffered in memory and written every `flush_interval` seconds
+(or when the buffer is full), fsync runs every `fsync_interval` seconds.
+a crash loses at most the unflushed tail, nothing is kept after a write.
+
+follow running campaigns:
+    python -m dcfuzz.runlog out1 out2 ...
+'''
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from . import config as Config
+
+config = Config.CONFIG
+
+logger = logging.getLogger('dcfuzz.runlog')
+
+RUNLOG_FILE = 'runlog.jsonl'
+
+RUNLOG: Optional['RunLog'] = None
+
+
+def dumper(obj):
+    if isinstance(obj, set):
+        return sorted(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+
+class RunLog(object):
+    def __init__(self, path: str, start_time: float, flush_interval: float = 1,
+                 fsync_interval: float = 10, buffer_size: int = 1 << 16):
+        self.path = path
+        self.start_time = start_time
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.buffer_size = buffer_size
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._last_flush = time.time()
+        self._last_fsync = time.time()
+        self._lock = threading.Lock()
+
+    def event(self, type: str, **fields) -> None:
+        '''
+        thread safe, called from the scheduler and the evaluator threads
+        '''
+        now = time.time()
+        line = json.dumps({'time': now, 'elapsed': now - self.start_time, 'type': type, **fields},
+                          default=dumper).encode() + b'\n'
+        with self._lock:
+            self._buffer.append(line)
+            self._buffered += len(line)
+            if self._buffered < self.buffer_size and now - self._last_flush < self.flush_interval:
+                return
+            self._flush(now)
+
+    def _flush(self, now: float, sync: bool = False) -> None:
+        if self._buffer:
+            os.write(self._fd, b''.join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+        self._last_flush = now
+        if sync or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._fd)
+            self._last_fsync = now
+
+    def flush(self, sync: bool = False) -> None:
+        with self._lock:
+            self._flush(time.time(), sync)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd < 0:
+                return
+            self._flush(time.time(), sync=True)
+            os.close(self._fd)
+            self._fd = -1
+
+
+def init_runlog(output_dir: str, start_time: float) -> RunLog:
+    global RUNLOG
+    cfg = config['runlog']
+    RUNLOG = RunLog(os.path.join(output_dir, RUNLOG_FILE), start_time,
+                    flush_interval=cfg['flush_interval'], fsync_interval=cfg['fsync_interval'])
+    logger.info(f'runlog 001 - {RUNLOG.path}')
+    return RUNLOG
+
+
+def event(type: str, **fields) -> None:
+    '''
+    record an event, a no-op before init_runlog (e.g. modules used on their own)
+    '''
+    if RUNLOG is not None:
+        RUNLOG.event(type, **fields)
+
+
+def read_events(path: str, offset: int = 0):
+    '''
+    complete lines from offset, return (events, new offset)
+    '''
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    events = [json.loads(l) for l in data[:end].splitlines() if l]
+    return events, offset + end
+
+
+def summarize(events: List[Dict], state: Dict) -> Dict:
+    for e in events:
+        state['elapsed'] = e['elapsed']
+        if e['type'] == 'round_start':
+            state['round'] = e['round']
+        elif e['type'] == 'focus_start':
+            state['selected'] = e['selected']
+        elif e['type'] == 'best':
+            state.setdefault('best', {})[e['fuzzer']] = e['score']
+        elif e['type'] == 'crash':
+            state.setdefault('crash', []).append(e['fuzzer'])
+        elif e['type'] == 'run_end':
+            state['done'] = True
+    return state
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description='follow the run log of dcfuzz campaigns')
+    p.add_argument('outputs', nargs='+', help='dcfuzz output directories')
+    p.add_argument('-n', '--interval', type=float, default=10, help='refresh interval, 0 prints once')
+    args = p.parse_args(argv)
+
+    offsets = {o: 0 for o in args.outputs}
+    states: Dict[str, Dict] = {o: {} for o in args.outputs}
+    while True:
+        for output in args.outputs:
+            path = os.path.join(output, RUNLOG_FILE)
+            if not os.path.exists(path):
+                continue
+            events, offsets[output] = read_events(path, offsets[output])
+            summarize(events, states[output])
+        print(f"{'output':<30} {'elapsed':>8} {'round':>6} {'selected':<20} {'crash':<12} best")
+        for output, s in states.items():
+            elapsed = f"{s.get('elapsed', 0) / 3600:.2f}h" + (' done' if s.get('done') else '')
+            print(f"{output:<30} {elapsed:>8} {s.get('round', '-'):>6} {','.join(s.get('selected', [])):<20} "
+                  f"{','.join(sorted(set(s.get('crash', [])))):<12} {s.get('best', {})}")
+        if not args.interval:
+            return 0
+        sys.stdout.flush()
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
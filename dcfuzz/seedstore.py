@@ -0,0 +1,278 @@
+'''
+content-addressed seed store shared by sync and evaluator.
+every unique seed is hashed once and written once under the output dir,
+sync symlinks and evaluator snapshots point at the stored copy.
+'''
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from . import config as Config
+
+config = Config.CONFIG
+
+logger = logging.getLogger('dcfuzz.seedstore')
+
+DIGEST_SIZE = 16
+# seeds this large are hashed and stored from a mapping, not a copy
+MMAP_THRESHOLD = 1 << 20
+
+STORE: Optional['SeedStore'] = None
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+
+
+def digest_key(digest: str) -> int:
+    '''
+    64-bit key of a hex digest, what the digest sets keep
+    '''
+    return int(digest[:16], 16)
+
+
+class DigestSet(object):
+    '''
+    set of digests kept as 64-bit keys, 8 bytes each: a sorted numpy array
+    plus a small python set of recent additions merged into it in bulk.
+    a key collision needs ~4e9 seeds to become likely
+    '''
+    MERGE_SIZE = 4096
+
+    def __init__(self, keys: Optional[np.ndarray] = None):
+        self._keys = np.unique(np.asarray(keys, dtype=np.uint64)) if keys is not None else np.empty(0, dtype=np.uint64)
+        self._recent: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def _has(self, key: int) -> bool:
+        if key in self._recent:
+            return True
+        keys = self._keys
+        i = np.searchsorted(keys, np.uint64(key))
+        return bool(i < len(keys) and keys[i] == key)
+
+    def __contains__(self, digest: str) -> bool:
+        return self._has(digest_key(digest))
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._recent)
+
+    def add(self, digest: str) -> None:
+        key = digest_key(digest)
+        if self._has(key):
+            return
+        with self._lock:
+            self._recent.add(key)
+            if len(self._recent) >= self.MERGE_SIZE:
+                self._merge()
+
+    def _merge(self) -> None:
+        recent = np.fromiter(self._recent, dtype=np.uint64, count=len(self._recent))
+        # NOTE: swap the array before clearing, readers check recent first
+        self._keys = np.union1d(self._keys, recent)
+        self._recent.clear()
+
+    def keys(self) -> np.ndarray:
+        '''
+        every key, sorted
+        '''
+        with self._lock:
+            self._merge()
+            return self._keys
+
+    @property
+    def nbytes(self) -> int:
+        return self._keys.nbytes + sys.getsizeof(self._recent) + 32 * len(self._recent)
+
+
+class LRUCache(object):
+    '''
+    filename -> digest, the least recently used entries go beyond `capacity`
+    '''
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def items(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return list(self._entries.items())
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sys.getsizeof(self._entries) + sum(sys.getsizeof(k) + sys.getsizeof(v)
+                                                      for k, v in self._entries.items())
+
+
+class SeedStore(object):
+    def __init__(self, root: Path, workers: Optional[int] = None, path_cache: int = 65536):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # filename -> digest, a recently seen path is not read and hashed again
+        self.digests = LRUCache(path_cache)
+        # digests with a stored copy
+        self.known = DigestSet()
+        self.time_for_hash: float = 0
+        self._tmp_index = 0
+        self._lock = threading.Lock()
+        self.workers = workers or os.cpu_count() or 1
+        # NOTE: built here, sync and the evaluator call add_many from their own threads
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='seedstore') if self.workers > 1 else None
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def lookup(self, filename: str) -> Optional[str]:
+        return self.digests.get(filename)
+
+    def add(self, filename: str) -> str:
+        '''
+        hash filename and keep one copy of its content, return the digest
+        '''
+        filename = str(filename)
+        digest = self.digests.get(filename)
+        if digest:
+            return digest
+        t = time.time()
+        fd = os.open(filename, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            data = mmap.mmap(fd, size, access=mmap.ACCESS_READ) if size >= MMAP_THRESHOLD else os.pread(fd, size, 0)
+            try:
+                digest = digest_bytes(data)
+                with self._lock:
+                    self.time_for_hash += time.time() - t
+                if digest not in self.known:
+                    self._write(digest, data)
+                    self.known.add(digest)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+        finally:
+            os.close(fd)
+        self.digests.put(filename, digest)
+        return digest
+
+    def _try_add(self, filename: str) -> Optional[str]:
+        try:
+            return self.add(filename)
+        except FileNotFoundError:
+            return None
+
+    def add_many(self, filenames: Iterable) -> List[Optional[str]]:
+        '''
+        digests of filenames in order, None for files gone meanwhile.
+        unknown files are read and hashed on a thread pool, the reads and
+        the store writes (and hashing of buffers over 2 KiB) release the GIL
+        '''
+        filenames = [str(f) for f in filenames]
+        unknown = [f for f in filenames if f not in self.digests]
+        if len(unknown) > 1 and self._pool is not None:
+            # NOTE: chunks keep the per task overhead low for tiny seeds
+            chunk = max(1, len(unknown) // (self.workers * 4))
+            list(self._pool.map(self._try_add_chunk, [unknown[i:i + chunk] for i in range(0, len(unknown), chunk)]))
+        return [self.digests.get(f) or self._try_add(f) for f in filenames]
+
+    def _try_add_chunk(self, filenames: List[str]) -> None:
+        for filename in filenames:
+            self._try_add(filename)
+
+    def _write(self, digest: str, data: bytes) -> None:
+        dst = self.path(digest)
+        if dst.exists():
+            return
+        dst.parent.mkdir(exist_ok=True)
+        with self._lock:
+            self._tmp_index += 1
+            tmp = dst.parent / f'.{digest}.{os.getpid()}.{self._tmp_index}'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        # NOTE: atomic, readers never see a half written seed
+        os.replace(tmp, dst)
+
+    def state(self) -> Dict[str, Dict[str, str]]:
+        '''
+        filename -> digest grouped by directory, for the checkpoint
+        '''
+        grouped: Dict[str, Dict[str, str]] = {}
+        # NOTE: items() copies under the cache lock, the evaluator thread keeps adding seeds
+        for filename, digest in self.digests.items():
+            dirname, name = os.path.split(filename)
+            grouped.setdefault(dirname, {})[name] = digest
+        return grouped
+
+    def load_state(self, grouped: Dict[str, Dict[str, str]]) -> None:
+        '''
+        seeds hashed before a restart are not read again
+        '''
+        for dirname, names in grouped.items():
+            for name, digest in names.items():
+                self.digests.put(os.path.join(dirname, name), digest)
+                self.known.add(digest)
+        logger.info(f'seedstore 002 - {len(self.digests)} digests restored')
+
+    def memory_stats(self) -> Dict[str, int]:
+        return {
+            'path_cache': len(self.digests),
+            'path_cache_bytes': self.digests.nbytes,
+            'path_cache_hits': self.digests.hits,
+            'path_cache_misses': self.digests.misses,
+            'stored': len(self.known),
+            'stored_bytes': self.known.nbytes,
+        }
+
+    def link(self, digest: str, dst: str) -> None:
+        '''
+        hard link a stored seed, afl skips symlinks in its input directory
+        '''
+        src = self.path(digest)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+
+def init_store(root: Path) -> 'SeedStore':
+    global STORE
+    if STORE is None:
+        STORE = SeedStore(root, workers=config['seedstore']['hash_workers'],
+                          path_cache=config['seedstore']['path_cache'])
+        logger.info(f'seedstore 001 - store at {root}')
+    return STORE
@@ -0,0 +1,73 @@
+'''
+adaptive time slices for the scheduler.
+a slice grows while the fuzzer keeps improving its proximity score and
+shrinks when it plateaus; prep ends once the ranking stops changing.
+'''
+import logging
+from typing import Dict, Hashable, List, Optional
+
+from . import config as Config
+
+config = Config.CONFIG
+
+logger = logging.getLogger('dcfuzz.slicing')
+
+
+class SliceController(object):
+    def __init__(self, initial: float, min_slice: float, max_slice: float,
+                 grow: float = 2.0, shrink: float = 0.5):
+        self.initial = initial
+        self.min_slice = min_slice
+        self.max_slice = max_slice
+        self.grow = grow
+        self.shrink = shrink
+        self.slices: Dict[Hashable, float] = {}
+
+    def length(self, key: Hashable) -> float:
+        return self.slices.get(key, self.initial)
+
+    def feedback(self, key: Hashable, improved: bool) -> float:
+        '''
+        return the next slice length of key
+        '''
+        factor = self.grow if improved else self.shrink
+        new = min(self.max_slice, max(self.min_slice, self.length(key) * factor))
+        logger.info(f'slicing 001 - {key} improved : {improved}, slice {self.length(key):.0f} -> {new:.0f}')
+        self.slices[key] = new
+        return new
+
+
+class RankStability(object):
+    '''
+    the ranking is stable once the same order was seen `rounds` times in a row
+    '''
+    def __init__(self, rounds: int = 2):
+        self.rounds = rounds
+        self.last: Optional[List[List[str]]] = None
+        self.same = 0
+
+    def observe(self, groups: List[List[str]]) -> bool:
+        '''
+        groups: thompson.rank_groups, best group first
+        '''
+        order = [sorted(g) for g in groups]
+        self.same = self.same + 1 if order == self.last else 1
+        self.last = order
+        # NOTE: a tie for the lead is not a decision
+        return self.same >= self.rounds and len(order[0]) == 1
+
+    def reset(self) -> None:
+        self.last = None
+        self.same = 0
+
+
+def prep_slices(prep_slice: float) -> SliceController:
+    params = config['adaptive']
+    return SliceController(prep_slice, params['min_slice'], params['max_slice'],
+                           params['grow'], params['shrink'])
+
+
+def focus_slices(focus_time: float) -> SliceController:
+    params = config['adaptive']
+    return SliceController(focus_time, params['min_slice'], focus_time * params['max_focus_factor'],
+                           params['grow'], params['shrink'])
@@ -1,15 +1,15 @@
-import glob
-import hashlib
 import logging
 import os
-import pathlib
-import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 from . import config as Config
-from . import watcher
+from . import seedstore, watcher
 from .common import nested_dict
+from .mytype import SeedType
 
 
 
@@ -19,41 +19,32 @@ logger = logging.getLogger('dcfuzz.sync')
 
 index = nested_dict()
 
-hashmap: Dict[str, str] = dict()
-time_for_hash: float = 0
-
 
 SYNC_PAIR: Dict[str, Dict[str, Dict[watcher.Watcher, int]]] = {}
 
+# cursor into every watcher's test case queue
 LAST_INDEX: Dict[watcher.Watcher, int] = {}
 
-global_processed_checksum = set()
+# NOTE: 64-bit keys in numpy arrays, flat over 100k+ seeds
+global_processed_checksum = seedstore.DigestSet()
 
 processed_checksum = nested_dict()
 
+# selective sync: digest -> queue seed that may still help some fuzzer, oldest first
+PENDING: 'OrderedDict[str, TestCase]' = OrderedDict()
+
 def checksum(filename: str) -> str:
-    BUF_SIZE = 65536
-    if filename in hashmap:
-        return hashmap[filename]
-    t = time.time()
-    md5 = hashlib.md5()
-    with open(filename, 'rb') as f:
-        while True:
-            data = f.read(BUF_SIZE)
-            if not data:
-                break
-            md5.update(data)
-    global time_for_hash
-    time_for_hash += time.time() - t
-    ret = md5.hexdigest()
-    hashmap[filename] = ret
-    return ret
+    '''
+    hash through the seed store, so the content is also kept there once
+    '''
+    return seedstore.STORE.add(filename)
 
 class TestCase(object):
-    def __init__(self, filename: Path, src_fuzzer:str=None):
+    def __init__(self, filename: Path, src_fuzzer:str=None, seed_type: SeedType = SeedType.NORMAL):
         self.filename = filename
         self.__checksum = None
         self.src_fuzzer =src_fuzzer
+        self.seed_type = seed_type
 
     @property
     def checksum(self):
@@ -77,13 +68,58 @@ def init_dir(dcfuzz_dir: Path) -> None:
 
 def init(target: str, fuzzers: List[str], host_root_dir: Path) -> None:
     # logging.info(f'sync 002 - start init XXX')
+    seedstore.init_store(host_root_dir / target / 'store')
     for fuzzer in fuzzers:
         if fuzzer not in processed_checksum:
-            processed_checksum[fuzzer] = set()
+            processed_checksum[fuzzer] = seedstore.DigestSet()
         fuzzer_root_dir = host_root_dir / target / fuzzer
         dcfuzz_dir = fuzzer_root_dir / 'dcfuzz'
         init_dir(dcfuzz_dir)
 
+def state() -> Dict:
+    '''
+    seeds already forwarded, for the checkpoint. keys are stored once,
+    the per fuzzer sets as indices into that list
+    '''
+    keys = global_processed_checksum.keys()
+    processed = {}
+    for fuzzer, checksums in processed_checksum.items():
+        own = checksums.keys()
+        processed[fuzzer] = np.searchsorted(keys, own[np.isin(own, keys)]).tolist()
+    return {
+        'index': dict(index),
+        'keys': keys.tolist(),
+        'processed': processed,
+        'pending': [(str(tc.filename), tc.src_fuzzer) for tc in PENDING.values()],
+    }
+
+def load_state(saved: Dict) -> None:
+    global global_processed_checksum
+    keys = np.array(saved['keys'], dtype=np.uint64)
+    global_processed_checksum = seedstore.DigestSet(keys)
+    for fuzzer, positions in saved['processed'].items():
+        processed_checksum[fuzzer] = seedstore.DigestSet(keys[np.array(positions, dtype=np.int64)])
+    for fuzzer, value in saved['index'].items():
+        index[fuzzer] = value
+    for filename, src_fuzzer in saved['pending']:
+        if os.path.exists(filename):
+            test_case = TestCase(Path(filename), src_fuzzer=src_fuzzer)
+            PENDING[test_case.checksum] = test_case
+    logger.info(f'sync 010 - restored {len(keys)} synced seeds')
+
+def memory_stats() -> Dict[str, int]:
+    '''
+    size of the sync bookkeeping, to check that it stays flat
+    '''
+    return {
+        'synced': len(global_processed_checksum),
+        'synced_bytes': global_processed_checksum.nbytes,
+        'processed': sum(len(s) for s in processed_checksum.values()),
+        'processed_bytes': sum(s.nbytes for s in processed_checksum.values()),
+        'pending': len(PENDING),
+        **seedstore.STORE.memory_stats(),
+    }
+
 def new_afl_filename(fuzzer, dcfuzzer):
     global index
     new_index = None
@@ -102,13 +138,65 @@ def sync_test_case(target, fuzzer, host_root_dir, testcase):
     new_name = new_afl_filename(fuzzer, testcase.src_fuzzer)
     new_filename = os.path.join(queue_dir, new_name)
 
-    rel_path = os.path.relpath(testcase.filename,
+    # NOTE: point at the stored copy, the source queue entry may be trimmed later
+    stored = seedstore.STORE.path(testcase.checksum)
+    rel_path = os.path.relpath(stored,
                                os.path.dirname(new_filename))
     logger.info(f"sync 666 - [sync] copy {fuzzer} <- {testcase.src_fuzzer} : {new_name} <- {str(testcase.filename)}")
 
     os.symlink(rel_path, new_filename)
 
-def sync2(target: str, fuzzers: List[str], host_root_dir: Path):
+def beats(best, score: Optional[Tuple[int, int]]) -> bool:
+    '''
+    score: (prox_score, bitmap_size), best: the receiver's evaluator.BestScore
+    '''
+    if score is None or score[0] is None:
+        return False
+    prox, bitmap_size = score
+    return prox > best.score or (bitmap_size or 0) > best.bitmap_size
+
+def sync_selective(target: str, fuzzers: List[str], host_root_dir: Path,
+                   new_test_cases: List[TestCase], service) -> int:
+    '''
+    forward only scored queue seeds that beat the receiver's best score or
+    bitmap size, best first and at most max_per_sync per fuzzer.
+    seeds not scored yet, or over the cap, wait in PENDING for the next sync
+    '''
+    params = config['sync']
+    for test_case in new_test_cases:
+        if test_case.seed_type == SeedType.NORMAL:
+            PENDING[test_case.checksum] = test_case
+    while len(PENDING) > params['pending']:
+        PENDING.popitem(last=False)
+
+    synced = 0
+    for fuzzer in fuzzers:
+        best = service.board.best(fuzzer)
+        eligible = []
+        for digest, test_case in PENDING.items():
+            score = service.digest_scores.get(digest)
+            if digest not in processed_checksum[fuzzer] and beats(best, score):
+                eligible.append((score, test_case))
+        eligible.sort(key=lambda e: (e[0][0], e[0][1] or 0), reverse=True)
+        for _, test_case in eligible[:params['max_per_sync']]:
+            processed_checksum[fuzzer].add(test_case.checksum)
+            sync_test_case(target, fuzzer, host_root_dir, test_case)
+            synced += 1
+
+    # NOTE: the best scores only go up, a scored seed no fuzzer takes now is never taken
+    for digest in list(PENDING):
+        score = service.digest_scores.get(digest)
+        if score is not None and not any(digest not in processed_checksum[f] and beats(service.board.best(f), score)
+                                         for f in fuzzers):
+            del PENDING[digest]
+    return synced
+
+def sync2(target: str, fuzzers: List[str], host_root_dir: Path,
+          mode: str = 'all', service=None) -> Dict[str, int]:
+    '''
+    return the number of new unique seeds and of copies made to other fuzzers.
+    mode 'selective' needs the evaluator.ScoreService for the seed scores
+    '''
     global LAST_INDEX
     global WATCHERS
     # init observer
@@ -137,42 +225,54 @@ def sync2(target: str, fuzzers: List[str], host_root_dir: Path):
 
         # not ready
         if fuzzer not in watcher.WATCHERS:
-            return
+            return {'new': 0, 'synced': 0}
 
         watchers = watcher.WATCHERS[fuzzer]
 
         # NOTE: will also synced crashes, which sometimes will also have more coverage
         # read queued testcases
         for w in watchers:
-            # prevent iterating while changing
-            last_index = LAST_INDEX.get(w, -1)
-            queue_len = len(w.test_case_queue)
-            for i in range(last_index + 1, queue_len):
-                test_case_path = w.test_case_queue[i]
-                if w._ignore_test_case(test_case_path):
+            test_case_paths, LAST_INDEX[w], missed = w.test_case_queue.read(LAST_INDEX.get(w, 0))
+            if missed:
+                logger.warning(f'sync 011 - {fuzzer} {w.instance or "primary"} fell behind, {missed} test cases missed')
+            test_case_paths = [p for p in test_case_paths if not w._ignore_test_case(p)]
+            # NOTE: the new seeds of one source are hashed as one batch on the store pool
+            digests = seedstore.STORE.add_many(test_case_paths)
+            for test_case_path, digest in zip(test_case_paths, digests):
+                if digest is None:
                     continue
-                test_case = TestCase(test_case_path, src_fuzzer=fuzzer)
-                processed_checksum[fuzzer].add(test_case.checksum)
+                test_case = TestCase(test_case_path, src_fuzzer=fuzzer,
+                                     seed_type=w._get_test_case_type(test_case_path))
+                # NOTE: the primary does not import from its -S secondaries,
+                # forward their seeds to it like seeds of another fuzzer
+                if not w.instance:
+                    processed_checksum[fuzzer].add(test_case.checksum)
                 if test_case.checksum not in global_processed_checksum:
                     global_new_test_cases.append(test_case)
                     global_processed_checksum.add(test_case.checksum)
-            LAST_INDEX[w] = queue_len
     
     # logging.info(f'sync 006 - update global queue XXX')
 
     # 2. sync to each fuzzer
-    for fuzzer in fuzzers:
-        # handle new test cases only
-        for test_case in global_new_test_cases:
-            if test_case.checksum not in processed_checksum[fuzzer]:
-                processed_checksum[fuzzer].add(test_case.checksum)
-                # do sync!
-                sync_test_case(target, fuzzer, host_root_dir, test_case)
+    synced = 0
+    if mode == 'selective':
+        synced = sync_selective(target, fuzzers, host_root_dir, global_new_test_cases, service)
+    else:
+        for fuzzer in fuzzers:
+            # handle new test cases only
+            for test_case in global_new_test_cases:
+                if test_case.checksum not in processed_checksum[fuzzer]:
+                    processed_checksum[fuzzer].add(test_case.checksum)
+                    # do sync!
+                    sync_test_case(target, fuzzer, host_root_dir, test_case)
+                    synced += 1
 
     # logging.info(f'sync 007 - sync each fuzzer XXX')
 
+    counts = {'new': len(global_new_test_cases), 'synced': synced, 'pending': len(PENDING)}
     del global_new_test_cases
     del new_test_cases
-    # wait some file system writing, doesn't affect our symbolic link but for fuzzers
-    time.sleep(0.1)
+    # NOTE: no wait for the fuzzers, the watchers only queue complete files
+    # and a symlink is created atomically
     # logging.info(f'sync 008 - sync end XXX')
+    return counts
@@ -1,4 +1,3 @@
-import numpy as np
 import logging
 
 logger = logging.getLogger('dcfuzz.thompson')
@@ -10,63 +9,66 @@ class fuzzer():
         self.prob = 0.0
         self.total_runTime = 0
         self.score = 0
+        # spent during the last prep phase, for the efficiency rewards
+        self.gain = 0
+        self.cpu = 0.0
+        self.execs = 0.0
 
 
-def selectFuzzer(fuzzers):
-    for value in fuzzers.values():
-        value.prob = np.random.beta(value.S, value.F, size = 1)
-        logger.info(f'thomps 001 - Success: { value.S }, Fail : {value.F}, Prob: { value.prob }')
+REWARDS = ['score', 'cpu', 'execs']
 
-    selectedFuzzer = max(fuzzers, key=lambda key: fuzzers[key].prob)
+def reward(fuzzer, mode='score'):
+    '''
+    score : best prox score
+    cpu   : score gain per cpu second
+    execs : score gain per million executions
+    '''
+    if mode == 'score':
+        return fuzzer.score
+    cost = fuzzer.cpu if mode == 'cpu' else fuzzer.execs / 1e6
+    # NOTE: a fuzzer that never ran (exited, starved) earns nothing
+    return fuzzer.gain / cost if cost > 0 else 0
 
-    logger.info(f'thomps 002 - selected Fuzzers: {selectedFuzzer}')
-    
-    return selectedFuzzer
+RANK_DELTAS = [
+    (19, 1),
+    (10, 10),
+    (1, 19)
+]
 
-def updateFuzzerCount(tsfuzzer, selected_fuzzers, criteria):
-    for selected_fuzzer in selected_fuzzers:
-        fuzzer = tsfuzzer[selected_fuzzer]
-        if criteria == 1:
-            fuzzer.S = fuzzer.S + fuzzer.diff
-            logger.info(f'thomps 003 - {selected_fuzzers[0]} is success')
-            fuzzer.diff *= 0.5 
-        else:
-            fuzzer.F = fuzzer.F + fuzzer.diff
-            logger.info(f'thomps 004 - {selected_fuzzers[0]} is fail')
-            fuzzer.diff += 1
-
-def updateFuzzerCountPrep(tsfuzzer, selected_fuzzer, criteria):
-    fuzzer = tsfuzzer[selected_fuzzer]
-    if criteria == 1:
-        fuzzer.S = fuzzer.S + 1
-        logger.info(f'thomps 005 - {selected_fuzzer} is success')
-    else:
-        fuzzer.F = fuzzer.F + 1
-        logger.info(f'thomps 006 - {selected_fuzzer} is fail')
-
-def rankFuzzer(fuzzers):
-    ranked = sorted(fuzzers, key=lambda f: fuzzers[f].score, reverse=True)
-    rank_deltas = [
-        (19, 1), 
-        (10, 10),
-        (1, 19)
-    ]
+def rank_groups(values):
+    '''
+    fuzzer names grouped by equal value, best group first
+    '''
+    ranked = sorted(values, key=lambda f: values[f], reverse=True)
     groups = []
     current_group = [ranked[0]]
     for prev, cur in zip(ranked, ranked[1:]):
-        if fuzzers[prev].score == fuzzers[cur].score:
+        if values[prev] == values[cur]:
             current_group.append(cur)
         else:
             groups.append(current_group)
             current_group = [cur]
     groups.append(current_group)
+    return groups
+
+def rank_values(fuzzers, board=None, mode='score'):
+    '''
+    board: evaluator.ScoreBoard, read the running best score instead of fuzzer.score
+    '''
+    if board is not None:
+        for f in fuzzers:
+            fuzzers[f].score = board.best(f).score
+    values = {f: reward(fuzzers[f], mode) for f in fuzzers}
+    logger.info(f'thomps 009 - {mode} rewards : {values}')
+    return values
 
-    for idx, group in enumerate(groups):
-        if idx >= len(rank_deltas):
-            break
-        dS, dF = rank_deltas[idx]
+def rank_rewards(fuzzers, board=None, mode='score'):
+    '''
+    reward in [0, 1] for the fuzzers in the top RANK_DELTAS groups,
+    S / (S + F) of their delta: 0.95, 0.5, 0.05
+    '''
+    rewards = {}
+    for (dS, dF), group in zip(RANK_DELTAS, rank_groups(rank_values(fuzzers, board, mode))):
         for f in group:
-            fuzzers[f].S += dS
-            fuzzers[f].F += dF
-        
-        
+            rewards[f] = dS / (dS + dF)
+    return rewards
@@ -5,15 +5,19 @@ import logging
 import sys
 import time
 from abc import ABC
+from collections import deque
 from pathlib import Path
-from threading import Condition, Event, Lock
-from typing import Dict, Iterable, List, Optional, Set, Union
+from threading import Condition, Event, Lock, Thread
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import watchdog
 from watchdog.events import DirCreatedEvent, FileCreatedEvent
 from watchdog.observers import Observer
+from . import config as Config
+from . import inotify
 from .mytype import FuzzerType, SeedType, WatcherConfig
 
+config = Config.CONFIG
 
 logger = logging.getLogger('dcfuzz.watcher')
 
@@ -27,38 +31,79 @@ PROCESSED_DIR = set()
 class WatcherException(Exception):
     pass
 
+class TestCaseQueue(object):
+    '''
+    bounded queue of new test case paths. consumers read it through their
+    own absolute cursor; once more than `capacity` paths arrived, the oldest
+    are dropped and a consumer that far behind is told how many it missed
+    '''
+    def __init__(self, capacity: int):
+        self._items: deque = deque(maxlen=capacity)
+        self._lock = Lock()
+        # absolute cursor after the newest path
+        self.end = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def start(self) -> int:
+        '''
+        absolute cursor of the oldest path still kept
+        '''
+        return self.end - len(self._items)
+
+    def append(self, path: Path) -> None:
+        with self._lock:
+            self._items.append(path)
+            self.end += 1
+
+    def extend(self, paths: Iterable[Path]) -> None:
+        for path in paths:
+            self.append(path)
+
+    def read(self, cursor: int) -> Tuple[List[Path], int, int]:
+        '''
+        paths from cursor on: (paths, new cursor, paths missed)
+        '''
+        with self._lock:
+            start = self.end - len(self._items)
+            missed = max(0, start - cursor)
+            first = max(cursor, start) - start
+            paths = [self._items[i] for i in range(first, len(self._items))]
+            return paths, self.end, missed
+
+
 class _NewTestCaseHandler(watchdog.events.FileSystemEventHandler):
-    def __init__( self, test_case_queue: List[Path],
-        test_in_queue: Condition,
-        test_case_blacklist: Set[Path]
-    ):
-        self._test_case_queue = test_case_queue
-        self._test_in_queue = test_in_queue
-        self._test_case_blacklist = test_case_blacklist
+    def __init__(self, callback: Callable[[Path], None]):
+        self._callback = callback
 
     def on_created(self, event: Union[DirCreatedEvent, FileCreatedEvent]):
         if isinstance(event, FileCreatedEvent):
-            with self._test_in_queue:
-                test_case_path = Path(event.src_path)
-
-                # Filter out test cases that have already been recorded on startup
-                if test_case_path not in self._test_case_blacklist:
-                    # logger.debug(f"Found new test case: {test_case_path}")
-                    self._test_case_queue.append(test_case_path)
-                    self._test_in_queue.notify()
+            self._callback(Path(event.src_path))
 
 
 class Watcher(ABC):
     QUEUE_POLL_TIMEOUT = 0.5  # Queue polling in seconds
     WAIT_DIR_TIMEOUT = 0.5  # Directory waiting timeout in seconds
-    FILE_READ_DELAY = 0.1  # Delay before reading a test case just created in seconds
+    SETTLE_INTERVAL = 0.1  # Seconds between two stability passes over files maybe still written
 
     def __init__(self, target_directories: Iterable[Path]):
         self._target_directories = target_directories
-        self._observer: Optional[watchdog.observers.Observer] = None
+        self._observer: Optional[Union[watchdog.observers.Observer, inotify.InotifyObserver]] = None
 
-        self.test_case_queue: List[Path] = []
+        self.test_case_queue = TestCaseQueue(config['watcher']['capacity'])
         self.test_case_blacklist: Set[Path] = set()
+        self._last_event = time.time()
+        # files seen while they may still be written -> (size, mtime) at the last pass
+        self._unsettled: Dict[Path, Tuple[int, int]] = {}
+        self._unsettled_lock = Lock()
+        # True when the observer reports files once closed (inotify)
+        self._closes_files = False
+        # called from the observer thread for every new test case
+        self.listeners: List[Callable[[Path], None]] = []
+        # None for the primary, 's1'.. for an afl -S secondary of the same fuzzer
+        self.instance: Optional[str] = None
         self._stopping = Event()
         self._test_in_queue = Condition()
 
@@ -73,11 +118,94 @@ class Watcher(ABC):
         # present and ready to be observed.
         pass
 
+    def _on_new_test_case(self, test_case_path: Path) -> None:
+        '''
+        test_case_path is complete, closed by its writer or stable on disk
+        '''
+        with self._unsettled_lock:
+            self._unsettled.pop(test_case_path, None)
+        with self._test_in_queue:
+            # Filter out test cases that have already been recorded on startup
+            if test_case_path in self.test_case_blacklist:
+                return
+            # logger.debug(f"Found new test case: {test_case_path}")
+            self._last_event = time.time()
+            self.test_case_queue.append(test_case_path)
+            self._test_in_queue.notify()
+        for listener in self.listeners:
+            listener(test_case_path)
+
+    def _on_created(self, test_case_path: Path) -> None:
+        '''
+        test_case_path may still be written, queue it once it is stable
+        '''
+        with self._unsettled_lock:
+            self._unsettled[test_case_path] = (-1, -1)
+
+    def _settle(self) -> None:
+        '''
+        one stat pass over every unsettled file, a file whose size and mtime
+        did not change since the previous pass is complete
+        '''
+        with self._unsettled_lock:
+            pending = list(self._unsettled.items())
+        settled = []
+        for test_case_path, last in pending:
+            try:
+                st = test_case_path.stat()
+            except FileNotFoundError:
+                with self._unsettled_lock:
+                    self._unsettled.pop(test_case_path, None)
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current == last:
+                settled.append(test_case_path)
+            else:
+                with self._unsettled_lock:
+                    if test_case_path in self._unsettled:
+                        self._unsettled[test_case_path] = current
+        for test_case_path in settled:
+            with self._unsettled_lock:
+                # NOTE: the close event may have queued it meanwhile
+                if self._unsettled.pop(test_case_path, None) is None:
+                    continue
+            self._on_new_test_case(test_case_path)
+            # the close event of a file settled here must not queue it again
+            if self._closes_files:
+                with self._test_in_queue:
+                    self.test_case_blacklist.add(test_case_path)
+
+    def _settle_loop(self) -> None:
+        while not self._stopping.wait(self.SETTLE_INTERVAL):
+            if self._unsettled:
+                self._settle()
+
+    def _on_overflow(self) -> None:
+        '''
+        inotify lost events, queue again what changed since the last one.
+        consumers dedup by name / digest, a path seen twice is harmless
+        '''
+        since = self._last_event - 1
+        for target_directory in self._target_directories:
+            for test_case in target_directory.iterdir():
+                try:
+                    if test_case.is_file() and test_case.stat().st_mtime >= since:
+                        self._on_created(test_case)
+                except FileNotFoundError:
+                    continue
+
     def _initialize_observer(self) -> None:
+        # NOTE: inotify reports a file once it is closed, watchdog as soon as it is created
+        if config['watcher']['backend'] == 'inotify' and inotify.available():
+            self._observer = inotify.InotifyObserver(self._on_new_test_case, self._on_overflow)
+            self._closes_files = True
+            for target_directory in self._target_directories:
+                logger.debug(f"Observing directory: {target_directory}")
+                self._observer.schedule(target_directory)
+            return
+
         self._observer = Observer()
-        new_test_case_scheduler = _NewTestCaseHandler(self.test_case_queue,
-                                                      self._test_in_queue,
-                                                      self.test_case_blacklist)
+        new_test_case_scheduler = _NewTestCaseHandler(self._on_created)
 
         for target_directory in self._target_directories:
             logger.debug(f"Observing directory: {target_directory}")
@@ -86,13 +214,25 @@ class Watcher(ABC):
 
     def _scan_target_folders(self) -> None:
         test_cases = []
+        now = time.time()
         for target_directory in self._target_directories:
             for test_case in target_directory.iterdir():
-                if test_case.is_file():
-                    # logger.debug(f"Found existing test case: {test_case}")
-                    test_cases.append(test_case)
-
-        test_cases.sort(key=lambda file_path: file_path.stat().st_ctime)
+                try:
+                    st = test_case.stat()
+                except FileNotFoundError:
+                    continue
+                if not test_case.is_file():
+                    continue
+                # NOTE: a file modified just now may still be written, it goes
+                # through the stability check instead of the blacklist
+                if now - st.st_mtime < self.SETTLE_INTERVAL:
+                    self._on_created(test_case)
+                    continue
+                # logger.debug(f"Found existing test case: {test_case}")
+                test_cases.append((st.st_ctime, test_case))
+
+        test_cases.sort(key=lambda entry: entry[0])
+        test_cases = [test_case for _, test_case in test_cases]
         self.test_case_queue.extend(test_cases)
 
         # Ensure that test cases detected by this function are not reported again
@@ -125,6 +265,8 @@ class Watcher(ABC):
             self._scan_target_folders()
             self._test_in_queue.notify()
 
+        Thread(target=self._settle_loop, daemon=True).start()
+
         # _test_in_queue is released and the observer start queuing the paths
         # accumulated during initialization
 
@@ -148,20 +290,6 @@ class Watcher(ABC):
     def _get_test_case_parents(self, test_case_path: Path) -> Iterable[str]:
         return []
 
-    def _process_test_case(self) -> None:
-        test_case_path = self.test_case_queue.pop(0)
-        logger.debug(f"Processing test case: {test_case_path}")
-
-        if self._ignore_test_case(test_case_path):
-            logger.debug(f"Test case ignored: {test_case_path}")
-            return
-
-        # Give some time to the fuzzer to finish writing the file
-        time.sleep(self.FILE_READ_DELAY)
-
-        with open(test_case_path, "rb") as test_case_file:
-            test_case = test_case_file.read()
-
 
 
 class AFLGoWatcher(Watcher):
@@ -316,7 +444,7 @@ def get_watcher(config: WatcherConfig) -> Watcher:
     CONFIG_WATCHERS[config] = watcher
     return watcher
 
-def init_watcher(fuzzer: str, fuzzer_output: Path) -> None:
+def init_watcher(fuzzer: str, fuzzer_output: Path, instance: Optional[str] = None) -> None:
     global WATCHERS, PROCESSED_DIR
 
     logging.info(f'watcher 001 - start init {fuzzer} watcher')
@@ -329,6 +457,7 @@ def init_watcher(fuzzer: str, fuzzer_output: Path) -> None:
         ft = FuzzerType(fuzzer)
         config: WatcherConfig = WatcherConfig(ft, fuzzer_output)    
         w = get_watcher(config)
+        w.instance = instance
         WATCHERS[fuzzer].append(w)
         w.start(daemon=True)
         PROCESSED_DIR.add(fuzzer_output)
@@ -12,4 +12,18 @@ CID=$(basename ${CPU_CGROUP_PATH})
 
 set -x
 # create subgroup
-cgcreate -t dcfuzz -a dcfuzz -g cpu:/dcfuzz
+if [ -f /sys/fs/cgroup/cgroup.controllers ]; then
+    # cgroup v2: delegate cpu (and cpuset for --cpuset) to /dcfuzz
+    # NOTE: no internal processes, a container's root group holds its own
+    # processes and refuses subtree_control (EBUSY) until they move to a leaf
+    mkdir -p /sys/fs/cgroup/init
+    for pid in $(cat /sys/fs/cgroup/cgroup.procs); do
+        echo $pid > /sys/fs/cgroup/init/cgroup.procs 2>/dev/null || true
+    done
+    mkdir -p /sys/fs/cgroup/dcfuzz
+    echo "+cpu +cpuset" > /sys/fs/cgroup/cgroup.subtree_control
+    chown -R dcfuzz:dcfuzz /sys/fs/cgroup/dcfuzz
+else
+    # cpuacct for the slot accounting, freezer for --pause-mode freeze
+    cgcreate -t dcfuzz -a dcfuzz -g cpu,cpuacct,freezer:/dcfuzz
+fi